@@ -0,0 +1,203 @@
+"""Режим нескольких процессов: главный процесс принимает апдейты, воркеры их обрабатывают.
+
+Один event loop упирается в одно ядро, поэтому при WORKER_PROCESSES > 1
+главный процесс только получает апдейты (getUpdates или webhook) и
+раскладывает их по очередям процессов-воркеров по user_id. Все апдейты
+пользователя попадают в один процесс, поэтому его сессия FSM, кэши и
+порядок сообщений остаются внутри этого процесса.
+
+Внутри воркера апдейты обрабатывает тот же UpdateWorkerPool, что и в режиме
+webhook. Планировщик напоминаний работает только в главном процессе;
+рассылку корзины дополнительно защищает аренда в базе (см. send_reminders).
+"""
+import asyncio
+import functools
+import logging
+import multiprocessing as mp
+import queue
+import signal
+
+from aiogram import Bot
+
+from config import WORKER_QUEUE_SIZE, WEBHOOK_QUEUE_TIMEOUT, METRICS_HOST, METRICS_PORT
+from .webhook import UpdateWorkerPool, update_user_id, serve, register_webhook, wait_for_stop_signal
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30
+WATCH_INTERVAL = 5
+# Как часто воркер без апдейтов проверяет, жив ли главный процесс
+PARENT_CHECK_INTERVAL = 1
+
+# --- ПРОЦЕСС-ВОРКЕР ---
+
+def worker_main(index: int, processes: int, updates: mp.Queue, token: str):
+    """Точка входа процесса-воркера"""
+    # Остановкой управляет главный процесс (через None в очереди): Ctrl+C и
+    # SIGTERM, разосланные всей группе процессов (systemd, docker), игнорируем,
+    # иначе воркер умрет без emit_shutdown и потеряет несохраненные состояния
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s | %(levelname)s | worker-{index} | %(name)s | %(message)s",
+    )
+    asyncio.run(_worker_loop(index, processes, updates, token))
+
+def _next_update(updates: mp.Queue):
+    """Следующий апдейт; None — пора остановиться (сигнал главного процесса или его смерть)"""
+    parent = mp.parent_process()
+    while True:
+        try:
+            return updates.get(timeout=PARENT_CHECK_INTERVAL)
+        except queue.Empty:
+            # Главный процесс убит без штатной остановки: не остаемся сиротой
+            if parent is not None and not parent.is_alive():
+                logger.warning("Главный процесс завершился, останавливаемся")
+                return None
+
+async def _worker_loop(index: int, processes: int, updates: mp.Queue, token: str):
+    # Импорт здесь: в главном процессе хендлеры и хранилище FSM не нужны
+    from .dispatcher import create_bot, create_dispatcher
+    from .utils.async_database import close_pool
+    from .utils.metrics import start_metrics_server
+
+    bot = create_bot(token)
+    # Общие сессии FSM в базе воркер разбирает только для своих пользователей
+    dp = create_dispatcher(shard=(index, processes))
+    pool = UpdateWorkerPool(dp, bot)
+    loop = asyncio.get_running_loop()
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    # У каждого процесса свои метрики: воркер i слушает METRICS_PORT + 1 + i
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + 1 + index) if METRICS_PORT else None
+    pool.start()
+    logger.info("Воркер %s запущен", index)
+    try:
+        while True:
+            update = await loop.run_in_executor(None, _next_update, updates)
+            if update is None:
+                break
+            # Без таймаута: очередь процесса сама ограничивает главный процесс
+            await pool.submit(update, timeout=None)
+    finally:
+        await pool.stop()
+        logger.info("Воркер %s: обработано %s апдейтов", index, pool.processed)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+        close_pool()
+
+# --- ГЛАВНЫЙ ПРОЦЕСС ---
+
+class ProcessRouter:
+    """Очереди и процессы-воркеры; апдейт уходит в процесс по user_id % N"""
+
+    def __init__(self, token: str, processes: int, queue_size: int = WORKER_QUEUE_SIZE):
+        self.token = token
+        # spawn: воркеры не наследуют event loop, потоки и соединения с базой
+        self._ctx = mp.get_context("spawn")
+        self._queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(processes)]
+        self._processes = [None] * processes
+        self._watch_task: asyncio.Task | None = None
+        self.rejected = 0
+        self.restarted = 0
+
+    def _spawn(self, index: int):
+        process = self._ctx.Process(
+            target=worker_main, args=(index, len(self._queues), self._queues[index], self.token),
+            name=f"bot-worker-{index}", daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        for index in range(len(self._queues)):
+            self._spawn(index)
+        self._watch_task = asyncio.create_task(self._watch())
+        logger.info("Запущено процессов-воркеров: %s", len(self._processes))
+
+    async def _watch(self):
+        # Упавший воркер перезапускаем с той же очередью: его пользователи никуда не переезжают
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive():
+                    logger.error("Воркер %s завершился с кодом %s, перезапускаем", index, process.exitcode)
+                    self.restarted += 1
+                    self._spawn(index)
+
+    async def stop(self, timeout: float = 30):
+        """Просит воркеров доработать очереди и ждет их завершения"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+        loop = asyncio.get_running_loop()
+        for q in self._queues:
+            await loop.run_in_executor(None, q.put, None)
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.warning("Воркер %s не завершился за %s с, останавливаем принудительно", process.name, timeout)
+                process.terminate()
+
+    async def submit(self, update: dict, timeout: float = WEBHOOK_QUEUE_TIMEOUT) -> bool:
+        q = self._queues[update_user_id(update) % len(self._queues)]
+        try:
+            q.put_nowait(update)
+            return True
+        except queue.Full:
+            pass
+        # Очередь полна: ждем места в потоке, не блокируя event loop
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, functools.partial(q.put, update, timeout=timeout))
+        except queue.Full:
+            self.rejected += 1
+            return False
+        return True
+
+async def poll_updates(bot: Bot, submit, allowed_updates):
+    """getUpdates в главном процессе; offset сдвигается только после передачи апдейта воркеру"""
+    await bot.delete_webhook(drop_pending_updates=True)
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates)
+        except Exception as e:
+            logger.warning("Ошибка getUpdates: %s", e)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            raw = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+            while not await submit(raw):
+                logger.warning("Очередь воркера переполнена, ждем (апдейт %s)", update.update_id)
+            offset = update.update_id + 1
+
+async def run_cluster(bot: Bot, token: str, processes: int, mode: str, allowed_updates):
+    router = ProcessRouter(token, processes)
+    router.start()
+    runner = None
+    poller = None
+    stopper = asyncio.create_task(wait_for_stop_signal())
+    try:
+        if mode == "webhook":
+            runner = await serve(router.submit)
+            await register_webhook(bot, allowed_updates)
+            await stopper
+        else:
+            # Работаем до SIGTERM/SIGINT; если опрос упал — тоже останавливаемся
+            poller = asyncio.create_task(poll_updates(bot, router.submit, allowed_updates))
+            await asyncio.wait({poller, stopper}, return_when=asyncio.FIRST_COMPLETED)
+            if poller.done():
+                poller.result()
+    finally:
+        for task in (poller, stopper):
+            if task is not None:
+                task.cancel()
+        if runner is not None:
+            await runner.cleanup()
+        # Воркеры дорабатывают очереди и штатно вызывают emit_shutdown
+        await router.stop()
+        logger.info("Кластер остановлен: отклонено %s апдейтов, перезапусков воркеров %s",
+                    router.rejected, router.restarted)
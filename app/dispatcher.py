@@ -0,0 +1,73 @@
+"""Сборка бота и диспетчера — общая для главного процесса и процессов-воркеров."""
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+
+from config import FSM_SAVE_DRAFTS, TELEGRAM_API_URL, LOOP_MONITOR_INTERVAL, FREQUENT_FOODS_FLUSH
+from .handlers import register_handlers, save_meal_draft
+from .utils.fsm_storage import SQLiteStorage, EvictingStorage
+from .utils.async_database import warm_food_index, flush_frequent_foods
+from .utils.loop_monitor import monitor_loop_lag
+from .utils import metrics
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+
+_background_tasks = set()
+
+def spawn_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def flush_frequent_foods_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_frequent_foods()
+        except Exception:
+            logger.exception("Не удалось сохранить счетчики частых продуктов")
+
+async def start_background_tasks():
+    # Индекс продуктов строится в фоне: прием апдейтов не ждет его, а поиск
+    # до готовности индекса идет через SQL
+    spawn_background(warm_food_index())
+    if LOOP_MONITOR_INTERVAL > 0:
+        spawn_background(monitor_loop_lag(LOOP_MONITOR_INTERVAL))
+    spawn_background(flush_frequent_foods_periodically(FREQUENT_FOODS_FLUSH))
+
+def create_bot(token: str) -> Bot:
+    # Свой адрес Bot API — локальный сервер или заглушка для нагрузочных тестов
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    bot = Bot(
+        token=token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    bot.session.middleware(metrics.ApiTimer())
+    return bot
+
+def create_dispatcher(shard: tuple[int, int] | None = None) -> Dispatcher:
+    # Состояния FSM переживают рестарт: кэш в памяти + пакетная запись в SQLite.
+    # Брошенные сессии вытесняются по TTL, число сессий в памяти ограничено.
+    # Dispatcher сам закроет хранилище (и допишет изменения) при остановке.
+    # shard — (номер воркера, число воркеров) в режиме кластера
+    storage = EvictingStorage(
+        SQLiteStorage(),
+        on_evict=save_meal_draft if FSM_SAVE_DRAFTS else None,
+        shard=shard
+    )
+    dp = Dispatcher(storage=storage)
+    dp.startup.register(start_background_tasks)
+    # Несброшенные счетчики частых продуктов — до закрытия пула соединений
+    dp.shutdown.register(flush_frequent_foods)
+    metrics.install(dp)
+    register_handlers(dp)
+    return dp
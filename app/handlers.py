@@ -1,24 +1,42 @@
+import asyncio
 import datetime
+import html
+import logging
 from aiogram import Dispatcher, types, F
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import (
     ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove,
-    InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+    InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent
 )
 
-from .utils.parser import parse_food_input
-from .utils.database import (
+from config import (
+    INLINE_CACHE_TIME, INLINE_DEBOUNCE, INLINE_RESULT_CACHE_SIZE, INLINE_RESULT_CACHE_TTL,
+    FREQUENT_FOODS_LIMIT,
+)
+from .utils.cache import TTLCache, MISSING
+from .utils.food_index import normalize_name
+
+from .utils.parser import parse_food_input, parse_meal_input, parse_reminder_times, parse_timezone
+from .utils.scheduler import ensure_bucket_job
+from .utils.async_database import (
     search_foods, 
+    search_foods_many,
     get_food_by_id, 
     upsert_user_profile, 
     get_user_profile, 
     log_meal, 
-    get_daily_stats,
-    get_daily_logs,
+    get_daily_snapshot,
+    get_history,
+    get_top_foods,
+    get_frequent_foods,
     reset_user_data,
-    add_custom_food
+    add_custom_food,
+    get_reminder_settings,
+    set_reminder_times,
+    set_user_timezone
 )
 
 # --- СОСТОЯНИЯ ---
@@ -99,6 +117,11 @@ def register_handlers(dp: Dispatcher):
     dp.message.register(cmd_start, CommandStart())
     dp.message.register(cmd_reset, Command("reset"))
     dp.message.register(check_db_content, Command("check"))
+    dp.message.register(cmd_week, Command("week"))
+    dp.message.register(cmd_month, Command("month"))
+    dp.message.register(cmd_top, Command("top"))
+    dp.message.register(cmd_remind, Command("remind"))
+    dp.message.register(cmd_timezone, Command("timezone"))
     
     # Добавление продуктов
     dp.message.register(cmd_add_food, Command("add_food")) 
@@ -121,6 +144,8 @@ def register_handlers(dp: Dispatcher):
     dp.message.register(process_food_weight, BotStates.waiting_for_weight)
     
     dp.callback_query.register(process_food_selection, F.data.startswith("food_id:"))
+
+    dp.inline_query.register(inline_food_search)
     
     dp.message.register(start_or_continue_meal, BotStates.collecting_meal)
     dp.message.register(start_or_continue_meal, F.text)
@@ -155,7 +180,9 @@ async def cmd_add_food(message: types.Message):
         f = float(parts[3].replace(",", "."))
         c = float(parts[4].replace(",", "."))
 
-        if add_custom_food(name, kcal, p, f, c):
+        if await add_custom_food(name, kcal, p, f, c):
+            # Новый продукт должен сразу находиться и в inline-поиске
+            inline_results.clear()
             await message.answer(f"✅ Продукт <b>{name.strip()}</b> добавлен! Теперь можно использовать.", parse_mode="HTML")
         else:
             await message.answer(f"Продукт с таким именем уже есть.", parse_mode="HTML")
@@ -164,8 +191,73 @@ async def cmd_add_food(message: types.Message):
     except Exception as e:
         await message.answer(f"⚠️ Ошибка: {e}")
 
+# --- INLINE-ПОИСК ---
+
+# Нормализованный запрос -> найденные продукты (вес в запросе на ключ не влияет)
+inline_results = TTLCache(INLINE_RESULT_CACHE_SIZE, INLINE_RESULT_CACHE_TTL)
+# user_id -> отложенный поиск по последнему inline-запросу; новый запрос отменяет прежний
+_inline_pending: dict[int, asyncio.Task] = {}
+
+def format_food_card(food, weight=None):
+    """Карточка продукта: КБЖУ на 100 г или на указанную порцию"""
+    factor = weight / 100.0 if weight else 1.0
+    portion = f"{weight} г" if weight else "100 г"
+    return (f"🔥 {food['kcal'] * factor:.0f} ккал | 🥩 {food['protein'] * factor:.1f} | "
+            f"🧈 {food['fat'] * factor:.1f} | 🍞 {food['carbs'] * factor:.1f} (на {portion})")
+
+async def inline_food_search(inline_query: InlineQuery):
+    name, weight = parse_food_input(inline_query.query)
+    user_id = inline_query.from_user.id
+    previous = _inline_pending.pop(user_id, None)
+    if previous is not None:
+        previous.cancel()
+    if not name:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME)
+        return
+    key = normalize_name(name)
+    foods = inline_results.get(key)
+    if foods is not MISSING:
+        await answer_inline_foods(inline_query, foods, weight)
+        return
+    # Промах кэша: пауза в наборе ждется в отдельной задаче, а не в хендлере.
+    # Иначе в webhook-режиме шард стоял бы всю паузу, а следующая буква того же
+    # пользователя доходила бы до хендлера уже после нее — и ничего не отбрасывалось
+    task = asyncio.create_task(_debounced_inline_search(inline_query, name, key, weight))
+    _inline_pending[user_id] = task
+
+    def forget(done):
+        if _inline_pending.get(user_id) is done:
+            del _inline_pending[user_id]
+    task.add_done_callback(forget)
+
+async def _debounced_inline_search(inline_query: InlineQuery, name, key, weight):
+    await asyncio.sleep(INLINE_DEBOUNCE)
+    try:
+        foods = [dict(f) for f in await search_foods(name)]
+        inline_results.set(key, foods)
+        await answer_inline_foods(inline_query, foods, weight)
+    except Exception:
+        logging.exception("Ошибка inline-поиска «%s»", name)
+
+async def answer_inline_foods(inline_query: InlineQuery, foods, weight):
+    results = [
+        InlineQueryResultArticle(
+            id=str(food['id']),
+            title=food['name'],
+            description=format_food_card(food, weight),
+            input_message_content=InputTextMessageContent(
+                # Названия продуктов пользователей могут содержать "<" и "&": без
+                # экранирования Telegram отклонит весь ответ на inline-запрос
+                message_text=f"<b>{html.escape(food['name'])}</b>\n{format_food_card(food, weight)}",
+                parse_mode="HTML"
+            )
+        )
+        for food in foods
+    ]
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+
 async def check_db_content(message: types.Message):
-    foods = search_foods("а")
+    foods = await search_foods("а")
     if foods:
         sample = "\n".join([f"🔹 {f['name']} ({f['kcal']} ккал)" for f in foods[:5]])
         await message.answer(f"База найдена! Примеры продуктов:\n{sample}")
@@ -175,7 +267,7 @@ async def check_db_content(message: types.Message):
 async def cmd_start(message: types.Message | types.CallbackQuery, state: FSMContext):
     await state.clear()
     user_id = message.from_user.id
-    user = get_user_profile(user_id)
+    user = await get_user_profile(user_id)
     is_callback = isinstance(message, types.CallbackQuery)
     target = message.message if is_callback else message
 
@@ -191,7 +283,7 @@ async def cmd_start(message: types.Message | types.CallbackQuery, state: FSMCont
 
 async def cmd_reset(message: types.Message, state: FSMContext):
     await state.clear()
-    if reset_user_data(message.from_user.id):
+    if await reset_user_data(message.from_user.id):
         inline_kb = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="Начать настройку заново 🚀", callback_data="re_start")]
         ])
@@ -203,11 +295,44 @@ async def cmd_reset(message: types.Message, state: FSMContext):
 async def ask_for_food(message: types.Message):
     await message.answer("Введите название продукта и вес (напр: <i>Курица 200</i>):", 
                          reply_markup=ReplyKeyboardRemove(), parse_mode="HTML")
+    await offer_frequent_foods(message)
+
+def get_frequent_foods_kb(foods):
+    # Кнопка сразу добавляет привычную порцию (округленную до 10 г) — без поиска и вопроса о весе
+    keyboard = []
+    for f in foods:
+        grams = max(10, round(f['grams'] / 10) * 10)
+        name = f"{f['name'][:22]}…" if len(f['name']) > 23 else f['name']
+        button = InlineKeyboardButton(text=f"{name} · {grams} г", callback_data=f"food_id:{f['id']}:{grams}")
+        if keyboard and len(keyboard[-1]) < 2:
+            keyboard[-1].append(button)
+        else:
+            keyboard.append([button])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+async def offer_frequent_foods(message: types.Message):
+    if FREQUENT_FOODS_LIMIT <= 0:
+        return
+    foods = await get_frequent_foods(message.from_user.id, FREQUENT_FOODS_LIMIT)
+    if foods:
+        await message.answer("⭐ Или выберите из частых:", reply_markup=get_frequent_foods_kb(foods))
+
+def get_food_choice_kb(foods, weight):
+    keyboard = []
+    for f in foods:
+        btn_text = f"{f['name'][:30]}... ({int(f['kcal'])} ккал)" if len(f['name']) > 30 else f"{f['name']} ({int(f['kcal'])} ккал)"
+        cb_data = f"food_id:{f['id']}:{weight if weight else 0}"
+        keyboard.append([InlineKeyboardButton(text=btn_text, callback_data=cb_data)])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 async def start_or_continue_meal(message: types.Message, state: FSMContext):
+    items = parse_meal_input(message.text)
+    if len(items) > 1:
+        await add_many_items(message, state, items)
+        return
     name, weight = parse_food_input(message.text)
     if not name: return 
-    foods = search_foods(name)
+    foods = await search_foods(name)
     if not foods:
         await message.reply(f"🤷‍♂️ Продукт «{name}» не найден.")
         return
@@ -220,17 +345,42 @@ async def start_or_continue_meal(message: types.Message, state: FSMContext):
         else:
             await add_item_to_meal(message, state, food, weight)
     else:
-        keyboard = []
-        for f in foods:
-            btn_text = f"{f['name'][:30]}... ({int(f['kcal'])} ккал)" if len(f['name']) > 30 else f"{f['name']} ({int(f['kcal'])} ккал)"
-            cb_data = f"food_id:{f['id']}:{weight if weight else 0}"
-            keyboard.append([InlineKeyboardButton(text=btn_text, callback_data=cb_data)])
-        await message.answer("🔍 Выберите вариант:", reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
+        await message.answer("🔍 Выберите вариант:", reply_markup=get_food_choice_kb(foods, weight))
+
+async def add_many_items(message: types.Message, state: FSMContext, items):
+    """Несколько продуктов одним сообщением: однозначные добавляем сразу, по остальным спрашиваем"""
+    found = await search_foods_many([name for name, _ in items])
+    added, unclear, missing = [], [], []
+    for (name, weight), foods in zip(items, found):
+        # Точное совпадение названия считаем однозначным, даже если нашлось несколько;
+        # в базе названия нормализованы, поэтому сравниваем с нормализованным вводом
+        key = normalize_name(name)
+        exact = [f for f in foods if f['name'] == key]
+        food = exact[0] if exact else (foods[0] if len(foods) == 1 else None)
+        if food is not None and weight:
+            added.append(make_meal_item(food, weight))
+        elif foods:
+            unclear.append((name, weight, [food] if food is not None else foods))
+        else:
+            missing.append(name)
+
+    if added:
+        data = await state.get_data()
+        meal = data.get('meal_list', []) + added
+        await state.update_data(meal_list=meal)
+        await state.set_state(BotStates.collecting_meal)
+        lines = "\n".join(f"➕ {x['name']} ({int(x['weight'])}г)" for x in added)
+        current_total = sum(x['kcal'] for x in meal)
+        await message.answer(f"{lines}\n💰 Итого в приеме: {int(current_total)} ккал", reply_markup=get_meal_kb())
+    if missing:
+        await message.reply("🤷‍♂️ Не найдено: " + ", ".join(f"«{name}»" for name in missing))
+    for name, weight, foods in unclear:
+        await message.answer(f"🔍 «{name}» — выберите вариант:", reply_markup=get_food_choice_kb(foods, weight))
 
 async def process_food_selection(callback: CallbackQuery, state: FSMContext):
     data_parts = callback.data.split(":")
     food_id, weight = int(data_parts[1]), float(data_parts[2])
-    food = get_food_by_id(food_id)
+    food = await get_food_by_id(food_id)
     if not food: return
     await state.update_data(current_food=dict(food))
     await callback.message.edit_text(f"✅ Выбрано: <b>{food['name']}</b>", parse_mode="HTML")
@@ -249,11 +399,14 @@ async def process_food_weight(message: types.Message, state: FSMContext):
     except:
         await message.answer("Введите числовое значение веса.")
 
-async def add_item_to_meal(message: types.Message, state: FSMContext, food, weight):
+def make_meal_item(food, weight):
     factor = weight / 100.0
-    item = {'kcal': food['kcal'] * factor, 'prot': food['protein'] * factor,
+    return {'kcal': food['kcal'] * factor, 'prot': food['protein'] * factor,
             'fat': food['fat'] * factor, 'carb': food['carbs'] * factor,
-            'name': food['name'], 'weight': weight}
+            'name': food['name'], 'weight': weight, 'food_id': food['id']}
+
+async def add_item_to_meal(message: types.Message, state: FSMContext, food, weight):
+    item = make_meal_item(food, weight)
     data = await state.get_data()
     meal = data.get('meal_list', [])
     meal.append(item)
@@ -266,6 +419,7 @@ async def add_item_to_meal(message: types.Message, state: FSMContext, food, weig
 async def ask_next_item(message: types.Message, state: FSMContext):
     await message.answer("✍️ Введите следующий продукт (напр: <i>Кофе 200</i>):", 
                          reply_markup=ReplyKeyboardRemove(), parse_mode="HTML")
+    await offer_frequent_foods(message)
 
 async def finish_meal(message: types.Message, state: FSMContext):
     data = await state.get_data()
@@ -276,18 +430,33 @@ async def finish_meal(message: types.Message, state: FSMContext):
     await message.answer("Как назовем этот прием пищи?", reply_markup=get_meal_names_kb())
     await state.set_state(BotStates.waiting_for_meal_name)
 
+def summarize_meal(meal):
+    tk, tp, tf, tc = sum(x['kcal'] for x in meal), sum(x['prot'] for x in meal), \
+                     sum(x['fat'] for x in meal), sum(x['carb'] for x in meal)
+    details = ", ".join([f"{x['name']} ({int(x['weight'])}г)" for x in meal])
+    return tk, tp, tf, tc, details
+
+def meal_item_rows(meal):
+    # food_id может не быть у позиций, собранных до появления meal_items (черновики FSM)
+    return [(x.get('food_id'), x['name'], x['weight'], x['kcal'], x['prot'], x['fat'], x['carb']) for x in meal]
+
+async def save_meal_draft(key, state, data):
+    """Брошенная сессия FSM: недособранный прием пищи сохраняем черновиком"""
+    meal = data.get('meal_list')
+    if not meal:
+        return
+    tk, tp, tf, tc, details = summarize_meal(meal)
+    await log_meal(key.user_id, tk, tp, tf, tc, details, "📝 Черновик", meal_item_rows(meal))
+
 async def save_meal_final(message: types.Message, state: FSMContext):
     meal_name = message.text
     data = await state.get_data()
     meal = data.get('meal_list', [])
-    tk, tp, tf, tc = sum(x['kcal'] for x in meal), sum(x['prot'] for x in meal), \
-                     sum(x['fat'] for x in meal), sum(x['carb'] for x in meal)
-    details = ", ".join([f"{x['name']} ({int(x['weight'])}г)" for x in meal])
-    log_meal(message.from_user.id, tk, tp, tf, tc, details, meal_name)
-    user = get_user_profile(message.from_user.id)
-    stats = get_daily_stats(message.from_user.id)
-    total_today = stats['total_kcal'] if (stats and stats['total_kcal']) else tk
-    norm = user['daily_norm'] if user else 2000
+    tk, tp, tf, tc, details = summarize_meal(meal)
+    # log_meal сразу возвращает итоги дня и норму из той же транзакции
+    totals = await log_meal(message.from_user.id, tk, tp, tf, tc, details, meal_name, meal_item_rows(meal))
+    total_today = totals['total_kcal'] if totals['total_kcal'] else tk
+    norm = totals['daily_norm'] if totals['daily_norm'] else 2000
     res = f"🍽 <b>{meal_name}</b> записан!\n🔥 Всего за прием: {int(tk)} ккал\n"
     res += f"\n⚠️ Превышение!" if total_today > norm else f"\n✅ Осталось {int(norm - total_today)} ккал."
     await message.answer(res, parse_mode="HTML", reply_markup=get_main_kb())
@@ -295,9 +464,10 @@ async def save_meal_final(message: types.Message, state: FSMContext):
 
 async def show_daily_stats_handler(message: types.Message):
     user_id = message.from_user.id
-    stats = get_daily_stats(user_id)
-    user = get_user_profile(user_id)
-    logs = get_daily_logs(user_id)
+    snapshot = await get_daily_snapshot(user_id)
+    stats = snapshot['totals']
+    user = snapshot['profile']
+    logs = snapshot['logs']
 
     if not user:
         await message.answer("⚠️ Рассчитайте норму через /start")
@@ -338,6 +508,126 @@ async def show_daily_stats_handler(message: types.Message):
     text += f"{get_progress_bar(percent)} <b>{percent:.0f}%</b>"
 
     await message.answer(text, parse_mode="HTML")
+
+async def cmd_week(message: types.Message):
+    await show_history(message, 7, "ЗА НЕДЕЛЮ")
+
+async def cmd_month(message: types.Message):
+    await show_history(message, 30, "ЗА МЕСЯЦ")
+
+async def show_history(message: types.Message, days: int, title: str):
+    user = await get_user_profile(message.from_user.id)
+    if not user:
+        await message.answer("⚠️ Рассчитайте норму через /start")
+        return
+
+    # Одно чтение диапазона из daily_totals вместо суммирования всех логов
+    history = await get_history(message.from_user.id, days)
+    if not history:
+        await message.answer("За этот период записей нет. Запишите прием пищи! 🍎")
+        return
+
+    norm = user['daily_norm']
+    text = f"📅 <b>СТАТИСТИКА {title}</b>\n\n"
+    for day in history:
+        percent = (day['kcal'] / norm) * 100 if norm > 0 else 0
+        date_label = datetime.date.fromisoformat(day['date']).strftime("%d.%m")
+        mark = "⚠️" if day['kcal'] > norm else "✅"
+        text += f"<code>{date_label}</code> {mark} {day['kcal']:.0f} ккал ({percent:.0f}%)\n"
+
+    logged = len(history)
+    avg_kcal = sum(d['kcal'] for d in history) / logged
+    avg_prot = sum(d['protein'] for d in history) / logged
+    avg_fat = sum(d['fat'] for d in history) / logged
+    avg_carb = sum(d['carbs'] for d in history) / logged
+    in_norm = sum(1 for d in history if d['kcal'] <= norm)
+
+    text += "────────────────────────────\n"
+    text += f"📆 Дней с записями: <b>{logged}</b> из {days}\n"
+    text += f"✅ В пределах нормы: <b>{in_norm}</b>\n\n"
+    text += f"<b>В среднем за день:</b>\n"
+    text += f"🥩 <b>Б:</b> {avg_prot:.1f} г | "
+    text += f"🥑 <b>Ж:</b> {avg_fat:.1f} г | "
+    text += f"🍞 <b>У:</b> {avg_carb:.1f} г\n"
+    text += f"🔥 <b>Итог:</b> {avg_kcal:.0f} / {norm:.0f} ккал\n"
+    text += f"{get_progress_bar((avg_kcal / norm) * 100 if norm > 0 else 0)}"
+
+    await message.answer(text, parse_mode="HTML")
+
+async def cmd_top(message: types.Message):
+    top = await get_top_foods(message.from_user.id, 30)
+    if not top:
+        await message.answer("За месяц записей нет. Запишите прием пищи! 🍎")
+        return
+
+    text = "🏆 <b>ЧАЩЕ ВСЕГО ЗА МЕСЯЦ</b>\n\n"
+    for i, food in enumerate(top, 1):
+        text += f"{i}. <b>{food['name']}</b> — {food['times']} раз, {food['grams']:.0f} г, {food['kcal']:.0f} ккал\n"
+    await message.answer(text, parse_mode="HTML")
+
+def format_minutes(minutes):
+    return ", ".join(f"{m // 60:02d}:{m % 60:02d}" for m in minutes) or "выключены"
+
+async def cmd_remind(message: types.Message, scheduler=None):
+    user_id = message.from_user.id
+    timezone, minutes = await get_reminder_settings(user_id)
+    if timezone is None:
+        await message.answer("⚠️ Рассчитайте норму через /start")
+        return
+
+    args = message.text.split(maxsplit=1)[1].strip() if len(message.text.split()) > 1 else ""
+    if not args:
+        await message.answer(
+            f"🔔 Напоминания: <b>{format_minutes(minutes)}</b> ({timezone})\n\n"
+            "Изменить: <code>/remind 9:00 14:00 20:00</code>\n"
+            "Выключить: <code>/remind off</code>\n"
+            "Часовой пояс: <code>/timezone Europe/Moscow</code> или <code>/timezone +3</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    if args.lower() in ("off", "выкл", "нет"):
+        new_minutes = []
+    else:
+        new_minutes = parse_reminder_times(args)
+        if not new_minutes:
+            await message.answer("❌ Укажите время в формате ЧЧ:ММ, например: <code>/remind 9:00 20:00</code>", parse_mode="HTML")
+            return
+        if len(new_minutes) > 5:
+            await message.answer("❌ Можно не больше 5 напоминаний в день.")
+            return
+
+    await set_reminder_times(user_id, new_minutes)
+    # В процессе-воркере кластера планировщика нет: новую корзину подхватит
+    # периодическая синхронизация в главном процессе
+    if scheduler is not None:
+        for minute in new_minutes:
+            ensure_bucket_job(scheduler, message.bot, timezone, minute)
+    await message.answer(f"✅ Напоминания: <b>{format_minutes(new_minutes)}</b> ({timezone})", parse_mode="HTML")
+
+async def cmd_timezone(message: types.Message, scheduler=None):
+    user_id = message.from_user.id
+    current, minutes = await get_reminder_settings(user_id)
+    if current is None:
+        await message.answer("⚠️ Рассчитайте норму через /start")
+        return
+
+    parts = message.text.split(maxsplit=1)
+    timezone = parse_timezone(parts[1]) if len(parts) > 1 else None
+    if timezone is None:
+        await message.answer(
+            f"🌍 Ваш часовой пояс: <b>{current}</b>\n"
+            "Изменить: <code>/timezone Europe/Moscow</code> или <code>/timezone +3</code>",
+            parse_mode="HTML"
+        )
+        return
+
+    await set_user_timezone(user_id, timezone)
+    if scheduler is not None:
+        for minute in minutes:
+            ensure_bucket_job(scheduler, message.bot, timezone, minute)
+    await message.answer(f"✅ Часовой пояс: <b>{timezone}</b>\n🔔 Напоминания: {format_minutes(minutes)}", parse_mode="HTML")
+
 async def process_gender(message: types.Message, state: FSMContext):
     await state.update_data(gender=message.text)
     await message.answer("Введите ваш возраст:")
@@ -376,7 +666,7 @@ async def process_activity(message: types.Message, state: FSMContext):
         elif 18.5 <= bmi < 25: status = "в норме ✅"
         elif 25 <= bmi < 30: status = "избыточный ⚠️"
         else: status = "ожирение 🚨"
-        upsert_user_profile(message.from_user.id, data['gender'], age, height, weight, message.text, daily_norm)
+        await upsert_user_profile(message.from_user.id, data['gender'], age, height, weight, message.text, daily_norm)
         res = (f"✅ <b>Профиль настроен!</b>\n\n📊 ИМТ: <b>{bmi}</b> ({status})\n🔥 Норма: <b>{daily_norm} ккал</b>")
         await message.answer(res, reply_markup=get_main_kb(), parse_mode="HTML")
         await state.clear()
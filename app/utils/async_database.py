@@ -0,0 +1,134 @@
+"""Асинхронная обёртка над app/utils/database.py.
+
+Каждый запрос выполняется в отдельном потоке пула, у потока есть своё
+долгоживущее соединение SQLite, поэтому event loop никогда не ждёт диск.
+Сигнатуры функций совпадают с синхронными, только их нужно await-ить.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_POOL_SIZE
+from . import database as db
+from .metrics import registry
+
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+def _timed_call(func, queued_at, args, kwargs):
+    # Выполняется в потоке пула: отдельно ожидание потока и сама функция
+    started = time.perf_counter()
+    label = ("func", func.__name__)
+    registry.observe("db_wait_seconds", label, started - queued_at)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        registry.observe("db_call_seconds", label, time.perf_counter() - started)
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет синхронную функцию БД в пуле соединений"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _timed_call, func, time.perf_counter(), args, kwargs)
+
+@registry.collector
+def _cache_metrics():
+    caches = db.cache_stats()
+    samples = []
+    # Серии одной метрики должны идти подряд
+    for name, kind, key in (("db_cache_hits_total", "counter", 'hits'),
+                            ("db_cache_misses_total", "counter", 'misses'),
+                            ("db_cache_size", "gauge", 'size')):
+        samples.extend((name, kind, {"cache": cache}, stats[key]) for cache, stats in caches.items())
+    samples.append(("db_pool_queue", "gauge", None, _executor._work_queue.qsize()))
+    return samples
+
+def close_pool():
+    """Дожидается текущих запросов и закрывает все соединения"""
+    _executor.shutdown(wait=True)
+    db.close_db_connections()
+
+# --- ПОИСК ПРОДУКТОВ ---
+async def warm_food_index():
+    return await run_db(db.warm_food_index)
+
+async def search_foods(query):
+    return await run_db(db.search_foods, query)
+
+async def search_foods_many(queries):
+    return await run_db(db.search_foods_many, queries)
+
+async def get_food_by_id(food_id: int):
+    return await run_db(db.get_food_by_id, food_id)
+
+async def add_custom_food(name, kcal, protein, fat, carbs):
+    return await run_db(db.add_custom_food, name, kcal, protein, fat, carbs)
+
+# --- ПОЛЬЗОВАТЕЛИ ---
+async def upsert_user_profile(user_id, gender, age, height, weight, activity_text, daily_norm):
+    return await run_db(db.upsert_user_profile, user_id, gender, age, height, weight, activity_text, daily_norm)
+
+async def get_reminder_user_ids(timezone, minute, cutoff, after_user_id, limit):
+    return await run_db(db.get_reminder_user_ids, timezone, minute, cutoff, after_user_id, limit)
+
+async def get_reminder_buckets():
+    return await run_db(db.get_reminder_buckets)
+
+async def get_reminder_settings(user_id):
+    return await run_db(db.get_reminder_settings, user_id)
+
+async def set_reminder_times(user_id, minutes):
+    return await run_db(db.set_reminder_times, user_id, minutes)
+
+async def set_user_timezone(user_id, timezone):
+    return await run_db(db.set_user_timezone, user_id, timezone)
+
+async def deactivate_users(user_ids):
+    return await run_db(db.deactivate_users, user_ids)
+
+async def get_user_profile(user_id):
+    return await run_db(db.get_user_profile, user_id)
+
+async def reset_user_data(user_id):
+    return await run_db(db.reset_user_data, user_id)
+
+# --- ЛОГИ (ПРИЕМЫ ПИЩИ) ---
+async def log_meal(user_id, kcal, p, f, c, details, meal_name="Прием пищи", items=()):
+    return await run_db(db.log_meal, user_id, kcal, p, f, c, details, meal_name, items)
+
+async def get_daily_logs(user_id):
+    return await run_db(db.get_daily_logs, user_id)
+
+async def get_daily_stats(user_id):
+    return await run_db(db.get_daily_stats, user_id)
+
+async def get_history(user_id, days):
+    return await run_db(db.get_history, user_id, days)
+
+async def get_top_foods(user_id, days, limit=10):
+    return await run_db(db.get_top_foods, user_id, days, limit)
+
+async def get_frequent_foods(user_id, limit):
+    # Попадание в кэш отдаем сразу, без очереди пула
+    foods = db.cached_frequent_foods(user_id, limit)
+    if foods is not None:
+        return foods
+    return await run_db(db.get_frequent_foods, user_id, limit)
+
+async def flush_frequent_foods():
+    return await run_db(db.flush_frequent_foods)
+
+async def get_daily_snapshot(user_id):
+    return await run_db(db.get_daily_snapshot, user_id)
+
+# --- СОСТОЯНИЯ FSM ---
+async def load_fsm_state(key):
+    return await run_db(db.load_fsm_state, key)
+
+async def get_stale_fsm_keys(idle_ttl, limit, after=('', '')):
+    return await run_db(db.get_stale_fsm_keys, idle_ttl, limit, after)
+
+async def take_stale_fsm_states(keys, idle_ttl):
+    return await run_db(db.take_stale_fsm_states, keys, idle_ttl)
+
+# --- АРЕНДЫ (LEASES) ---
+async def try_acquire_lease(name, owner, ttl):
+    return await run_db(db.try_acquire_lease, name, owner, ttl)
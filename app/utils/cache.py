@@ -0,0 +1,95 @@
+"""Небольшой LRU-кэш с TTL для горячих данных процесса.
+
+Потокобезопасен: функции database.py выполняются в потоках пула. Значения
+обновляются пишущими функциями (write-through), TTL лишь ограничивает
+устаревание, если база изменилась в обход процесса.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (срок годности, значение); порядок — от давно использованных
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        # Заполнение после промаха не должно затереть более свежую запись того же
+        # ключа. Каждая запись получает номер; _written — номера последних записей
+        # по ключам (не больше maxsize), для вытесненных из него ключей и после
+        # clear() берется _floor — номер, не меньший любой их записи
+        self._writes = 0
+        self._written: OrderedDict = OrderedDict()
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Значение или MISSING (None — тоже значение: "нет такого пользователя")"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def token(self):
+        """Запомнить перед чтением из базы и передать в fill"""
+        return self._writes
+
+    def fill(self, key, value, token):
+        """Кладет прочитанное из базы, если с момента token этот ключ не записывали"""
+        with self._lock:
+            if self._written.get(key, self._floor) <= token:
+                self._put(key, value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._mark_written(key)
+            self._put(key, value)
+
+    def pop(self, key):
+        with self._lock:
+            self._mark_written(key)
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._writes += 1
+            self._floor = self._writes
+            self._written.clear()
+            self._data.clear()
+
+    def _mark_written(self, key):
+        self._writes += 1
+        self._written[key] = self._writes
+        self._written.move_to_end(key)
+        if len(self._written) > self.maxsize:
+            _, number = self._written.popitem(last=False)
+            self._floor = number
+
+    def _put(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -1,409 +1,699 @@
 import sqlite3
 import os
-from config import DB_PATH
+import threading
+import time
+import datetime
+from config import (
+    DB_PATH, FUZZY_THRESHOLD, FOOD_INDEX_REFRESH,
+    DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_CACHED_STATEMENTS, DB_TRACE,
+    DEFAULT_TIMEZONE, DEFAULT_REMINDER_TIMES,
+    USER_CACHE_SIZE, USER_CACHE_TTL,
+)
+from .cache import TTLCache, MISSING
+from . import db_trace
+from .catalog import CATALOG_VERSION, catalog_rows, catalog_checksum
+from .food_index import food_index, normalize_name
+from .frequent_foods import usage_weight
+from .migrations import run_migrations
+from .parser import parse_reminder_times
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+# Каждый поток держит своё долгоживущее соединение (пул для async-слоя — это
+# потоки ThreadPoolExecutor, см. app/utils/async_database.py)
+_local = threading.local()
+_all_connections = []
+_connections_lock = threading.Lock()
+
+def _open_connection():
+    # Все SQL-тексты в модуле константы, поэтому кэш выражений sqlite3
+    # переиспользует подготовленные statements между вызовами
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=DB_CACHED_STATEMENTS,
+        check_same_thread=False,
+        # Трассировка только по флагу: без него — обычные курсоры без накладных расходов
+        factory=db_trace.TracingConnection if DB_TRACE else sqlite3.Connection,
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
+def get_db_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _open_connection()
+        _local.conn = conn
+        with _connections_lock:
+            _all_connections.append(conn)
+    return conn
+
+def close_db_connections():
+    """Закрывает все открытые соединения (вызывается при остановке бота)"""
+    with _connections_lock:
+        for conn in _all_connections:
+            conn.close()
+        _all_connections.clear()
+    _local.__dict__.clear()
+    if DB_TRACE:
+        db_trace.log_summary()
+
+# Профили (user_id -> строка users или None) и итоги дня ((user_id, date) -> dict или None).
+# Меняются только функциями этого модуля, и каждая из них обновляет кэш сама.
+# Дата в ключе — местная, как date('now', 'localtime'): после полуночи ключ новый
+profile_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+totals_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Частые продукты: user_id -> {food_id: [название, score, grams]} — то, что в
+# user_foods, плюс еще не сброшенное. Несброшенные приращения копятся в
+# _frequent_pending (тот же формат) и пишутся в базу flush_frequent_foods
+# раз в FREQUENT_FOODS_FLUSH секунд. Загрузка из базы и сброс идут под одним
+# замком, иначе приращение может потеряться или посчитаться дважды
+frequent_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+_frequent_pending = {}
+_frequent_lock = threading.Lock()
+
+def _today():
+    return datetime.date.today().isoformat()
+
+def _totals_dict(row):
+    if row is None:
+        return None
+    return {
+        'total_kcal': row['kcal'],
+        'total_prot': row['protein'],
+        'total_fat': row['fat'],
+        'total_carb': row['carbs'],
+    }
+
+def cache_stats():
+    """Счетчики попаданий и промахов кэшей"""
+    return {'profiles': profile_cache.stats(), 'totals': totals_cache.stats()}
+
 def init_db():
-    """Инициализация таблиц и автоматическое наполнение продуктами"""
+    """Миграции схемы и встроенный каталог продуктов"""
     conn = get_db_connection()
-    cur = conn.cursor()
     
-    # Таблица пользователей
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY,
-        age INTEGER,
-        weight REAL,
-        height REAL,
-        gender TEXT,
-        activity TEXT,
-        daily_norm REAL
-    )
-    """)
+    # Схема целиком описана миграциями
+    run_migrations(conn)
 
-    # Таблица логов
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        kcal REAL, protein REAL, fat REAL, carbs REAL,
-        details TEXT, meal_name TEXT,
-        date TEXT DEFAULT (date('now', 'localtime')),
-        timestamp DATETIME DEFAULT (datetime('now', 'localtime'))
-    )
-    """)
+    # Каталог применяется только при смене версии/контрольной суммы, поэтому рестарт дешевый
+    apply_builtin_catalog(conn)
 
-    # Таблица продуктов
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS foods (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        kcal REAL, protein REAL, fat REAL, carbs REAL
-    )
-    """)
-
-    # --- НАПОЛНЕНИЕ БАЗЫ ---
-    cur.execute("SELECT COUNT(*) FROM foods")
-    count = cur.fetchone()[0]
-
-    # Если база пустая или там старый короткий список
-    if count < 100:
-        cur.execute("DELETE FROM foods") # Очищаем перед заливкой
-        
-        big_foods_list = [
-            # --- КУРИЦА И ИНДЕЙКА ---
-            ('курица филе (сырое)', 113, 23.6, 1.9, 0.4),
-            ('курица филе (отварное)', 137, 29.8, 1.8, 0.0),
-            ('курица филе (жареное)', 165, 31.0, 4.5, 0.0),
-            ('курица филе (запеченное)', 150, 28.0, 3.5, 0.0),
-            ('курица гриль (с кожей)', 210, 25.0, 11.0, 0.0),
-            ('куриное бедро (без кости)', 160, 20.0, 9.0, 0.0),
-            ('куриное бедро (запеченное)', 185, 22.0, 10.5, 0.0),
-            ('куриные крылышки', 220, 18.0, 16.0, 0.0),
-            ('куриные крылышки (во фритюре)', 320, 16.0, 22.0, 12.0),
-            ('куриная печень (сырая)', 140, 19.0, 6.0, 1.0),
-            ('куриная печень (тушеная)', 165, 20.0, 8.5, 2.1),
-            ('куриные сердечки (тушеные)', 159, 16.0, 10.0, 0.8),
-            ('куриные желудки (отварные)', 130, 21.0, 4.5, 0.0),
-            ('куриный рулет', 160, 18.0, 9.0, 1.5),
-            ('курица карри', 140, 16.0, 7.0, 4.0),
-            ('наггетсы куриные жареные', 296, 15.2, 18.1, 18.4),
-            ('индейка филе (сырое)', 115, 24.0, 2.0, 0.0),
-            ('индейка филе (отварное)', 130, 26.5, 2.5, 0.0),
-            ('индейка филе (запеченное)', 145, 27.0, 3.8, 0.0),
-            ('индейка голень', 140, 20.0, 6.0, 0.0),
-            ('перепелка (тушка)', 230, 18.0, 17.0, 0.0),
-            ('перепелиное яйцо (1 шт)', 158, 13.0, 11.0, 0.4),
-            ('куриное яйцо вареное (1 шт)', 155, 12.58, 10.61, 1.12),
-            ('яичница/куриное яйцо  жаренон(1 шт)', 158, 13.6, 14.8, 0.8),
-            ('пельмени фермерские', 280, 9.0, 15.0, 26.0),
-
-            # --- ГОВЯДИНА, СВИНИНА, БАРАНИНА ---
-            ('говядина вырезка (сырая)', 187, 22.0, 11.0, 0.0),
-            ('говядина вырезка (отварная)', 220, 25.0, 13.0, 0.0),
-            ('говядина (тушеная)', 195, 21.0, 12.0, 0.0),
-            ('стейк рибай', 291, 24.0, 22.0, 0.0),
-            ('стейк филе-миньон', 210, 26.0, 11.0, 0.0),
-            ('говяжий фарш (нежирный)', 190, 19.0, 12.0, 0.0),
-            ('говяжий фарш (домашний)', 250, 17.0, 20.0, 0.0),
-            ('язык говяжий (отварной)', 170, 15.0, 12.0, 0.0),
-            ('печень говяжья (жареная)', 199, 21.0, 10.0, 5.0),
-            ('гуляш говяжий', 148, 16.0, 8.0, 3.0),
-            ('телятина', 172, 19.7, 10.3, 0.0),
-            ('свинина нежирная (лопатка)', 260, 16.0, 21.0, 0.0),
-            ('свиная шея (сырая)', 340, 14.0, 32.0, 0.0),
-            ('свиная шея (шашлык)', 280, 16.0, 24.0, 0.0),
-            ('корейка свиная', 242, 17.0, 19.0, 0.0),
-            ('свиной окорок', 261, 18.0, 21.0, 0.0),
-            ('баранина (мякоть)', 290, 17.0, 25.0, 0.0),
-            ('баранина (тушеная)', 220, 16.5, 17.0, 0.0),
-            ('утка филе (с кожей)', 337, 15.8, 28.0, 0.0),
-            ('гусь', 370, 16.0, 33.0, 0.0),
-            ('кролик', 156, 21.0, 8.0, 0.0),
-            ('оленина', 155, 23.0, 7.0, 0.0),
-            ('конина', 187, 21.0, 11.0, 0.0),
-
-            # --- КОЛБАСЫ И ДЕЛИКАТЕСЫ ---
-            ('колбаса докторская', 250, 12.0, 22.0, 1.5),
-            ('колбаса с/к (салями)', 470, 17.0, 44.0, 1.0),
-            ('сервелат', 461, 16.0, 44.0, 0.5),
-            ('сосиски молочные', 260, 11.0, 23.0, 1.5),
-            ('ветчина индейка', 100, 15.0, 4.0, 1.0),
-            ('бекон (сырокопченый)', 540, 37.0, 42.0, 1.4),
-            ('бекон (жареный)', 620, 25.0, 58.0, 1.0),
-            ('хамон', 240, 25.0, 15.0, 1.0),
-            ('бастурма', 210, 33.0, 8.0, 2.0),
-            ('буженина', 255, 17.0, 21.0, 0.0),
-            ('паштет гусиный', 420, 11.0, 41.0, 2.0),
-            ('кровяная колбаса', 379, 14.0, 35.0, 1.0),
-
-            # --- РЫБА И МОРЕПРОДУКТЫ ---
-            ('лосось семга', 208, 20.0, 13.0, 0.0),
-            ('форель запеченная', 190, 20.0, 12.0, 0.0),
-            ('тунец свежий', 140, 24.0, 4.0, 0.0),
-            ('тунец консервированный', 100, 22.0, 1.0, 0.0),
-            ('треска отварная', 82, 18.0, 0.7, 0.0),
-            ('минтай запеченный', 72, 16.0, 0.9, 0.0),
-            ('скумбрия копченая', 200, 18.0, 14.0, 0.0),
-            ('сельдь м/с', 210, 17.0, 15.0, 0.0),
-            ('сибас гриль', 97, 18.0, 3.0, 0.0),
-            ('дорадо запеченная', 96, 18.0, 2.0, 0.0),
-            ('креветки отварные', 95, 20.0, 1.0, 0.0),
-            ('кальмары отварные', 100, 18.0, 2.0, 2.0),
-            ('мидии в с/с', 77, 11.5, 2.0, 3.3),
-            ('осьминог отварной', 82, 15.0, 1.0, 2.0),
-            ('икра красная', 250, 31.0, 13.0, 1.0),
-            ('угорь копченый', 320, 15.0, 28.0, 0.0),
-            ('хек тушеный', 95, 17.0, 3.0, 0.0),
-            ('камбала на пару', 85, 16.0, 2.0, 0.0),
-            ('крабовые палочки', 95, 6.0, 1.0, 15.0),
-            ('морской окунь', 103, 18.0, 3.3, 0.0),
-            ('анчоусы в масле', 210, 28.0, 10.0, 0.0),
-            ('лангустины гриль', 110, 21.0, 2.0, 0.0),
-
-            # --- КРУПЫ И БОБОВЫЕ ---
-            ('гречка (сухая)', 308, 12.6, 3.3, 57.1),
-            ('гречка (отварная на воде)', 110, 4.2, 1.1, 21.0),
-            ('рис белый (сухой)', 344, 6.7, 0.7, 78.9),
-            ('рис белый (отварной)', 116, 2.2, 0.5, 24.9),
-            ('рис бурый (сухой)', 330, 7.5, 2.0, 70.0),
-            ('киноа (сухая)', 368, 14.1, 6.1, 64.2),
-            ('овсянка геркулес (сухая)', 389, 16.0, 7.0, 66.0),
-            ('овсяная каша (на воде)', 88, 3.0, 1.7, 15.0),
-            ('макароны (тв. пшеница, сухие)', 350, 12.0, 1.5, 71.0),
-            ('макароны (отварные)', 140, 5.0, 0.6, 28.0),
-            ('булгур (сухой)', 342, 12.0, 1.3, 76.0),
-            ('кускус (сухой)', 376, 12.8, 0.6, 77.0),
-            ('чечевица (сухая)', 310, 24.0, 1.5, 50.0),
-            ('нут (сухой)', 360, 19.0, 6.0, 50.0),
-            ('маш (сухой)', 300, 23.5, 2.0, 46.0),
-            ('фасоль белая (консерв.)', 90, 7.0, 0.5, 15.0),
-            ('горох (сухой)', 300, 20.0, 2.0, 50.0),
-            ('полба (сухая)', 338, 14.5, 2.4, 70.0),
-            ('тофу плотный', 83, 10.0, 5.0, 1.1),
-            ('фучжу (соевая спаржа сухая)', 440, 45.0, 20.0, 20.0),
-
-            # --- ОВОЩИ, ГРИБЫ И ЗЕЛЕНЬ ---
-            ('картофель (сырой)', 77, 2.0, 0.4, 16.3),
-            ('картофель (отварной)', 82, 2.0, 0.4, 16.7),
-            ('картофель фри', 312, 3.4, 15.5, 41.2),
-            ('картофель по-деревенски', 140, 2.5, 6.0, 20.0),
-            ('огурец свежий', 15, 0.8, 0.1, 2.8),
-            ('помидор свежий', 18, 0.9, 0.2, 3.9),
-            ('авокадо (мякоть)', 160, 2.0, 14.7, 1.8),
-            ('брокколи (сырая)', 34, 2.8, 0.4, 7.0),
-            ('кабачок (сырой)', 24, 0.6, 0.3, 4.6),
-            ('баклажан (запеченный)', 45, 1.2, 2.0, 6.5),
-            ('тыква (запеченная)', 26, 1.0, 0.1, 4.4),
-            ('свекла (отварная)', 49, 1.8, 0.1, 10.8),
-            ('болгарский перец', 26, 1.3, 0.1, 5.3),
-            ('морковь (свежая)', 41, 0.9, 0.2, 10.0),
-            ('морковь по-корейски', 110, 1.2, 8.0, 9.0),
-            ('квашеная капуста', 19, 0.9, 0.1, 4.4),
-            ('спаржа на пару', 22, 2.4, 0.2, 3.0),
-            ('шпинат свежий', 23, 2.9, 0.4, 3.6),
-            ('грибы шампиньоны (сырые)', 27, 4.3, 1.0, 0.1),
-            ('грибы белые (жареные)', 160, 4.5, 14.0, 3.2),
-            ('морская капуста', 24, 0.9, 0.2, 3.0),
-
-            # --- ФРУКТЫ И ЯГОДЫ ---
-            ('яблоко', 52, 0.3, 0.2, 13.8),
-            ('банан', 89, 1.1, 0.3, 22.8),
-            ('груша', 57, 0.4, 0.1, 15.2),
-            ('апельсин', 47, 0.9, 0.1, 11.8),
-            ('грейпфрут', 42, 0.8, 0.1, 11.0),
-            ('киви', 61, 1.1, 0.5, 14.7),
-            ('манго', 60, 0.8, 0.4, 15.0),
-            ('клубника', 33, 0.7, 0.3, 7.7),
-            ('голубика', 57, 0.7, 0.3, 14.5),
-            ('чернослив сушеный', 240, 2.3, 0.7, 57.0),
-            ('курага сушеная', 241, 3.3, 0.5, 62.0),
-            ('финики сушеные', 277, 2.5, 0.5, 75.0),
-            ('арбуз', 30, 0.6, 0.1, 7.5),
-            ('дыня', 33, 0.6, 0.3, 7.4),
-
-            # --- МОЛОЧНЫЕ ПРОДУКТЫ И СЫРЫ ---
-            ('молоко 2.5%', 52, 3.0, 2.5, 4.7),
-            ('молоко 3.2%', 60, 3.2, 3.2, 4.8),
-            ('молоко миндальное (б/с)', 15, 0.5, 1.1, 0.3),
-            ('кефир 1%', 40, 3.0, 1.0, 4.0),
-            ('ряженка 4%', 67, 2.9, 4.0, 4.1),
-            ('творог 5%', 121, 17.2, 5.0, 1.8),
-            ('творог 9%', 159, 16.0, 9.0, 3.0),
-            ('творог зерненый', 95, 11.0, 5.0, 2.5),
-            ('йогурт греческий 0%', 57, 10.0, 0.0, 4.0),
-            ('сметана 15%', 160, 2.7, 15.0, 3.0),
-            ('сыр российский', 363, 23.0, 29.5, 0.0),
-            ('сыр пармезан', 431, 38.0, 28.0, 4.1),
-            ('сыр моцарелла', 280, 22.0, 22.0, 2.2),
-            ('сыр фета', 264, 14.2, 21.3, 4.1),
-            ('сыр адыгейский', 226, 16.0, 18.0, 0.0),
-            ('сыр сулугуни', 285, 19.5, 22.0, 0.0),
-            ('сыр бри / камамбер', 310, 20.0, 25.0, 0.5),
-            ('сыр рикотта', 174, 11.2, 13.0, 3.0),
-            ('сливочное масло 82.5%', 748, 0.5, 82.5, 0.8),
-
-            # --- ФАСТФУД ---
-            ('бургер классик', 254, 13.2, 12.5, 23.1),
-            ('биг мак', 257, 12.0, 14.0, 20.0),
-            ('шаурма с курицей', 175, 9.0, 8.5, 16.2),
-            ('пицца маргарита', 210, 9.1, 8.2, 26.3),
-            ('пицца пепперони', 270, 11.0, 13.0, 26.0),
-            ('суши филадельфия', 145, 6.2, 6.1, 17.5),
-            ('ролл калифорния', 176, 5.1, 7.2, 22.5),
-
-            # --- СЛАДОСТИ И ДЕСЕРТЫ ---
-            ('шоколад горький 70%', 540, 8.0, 43.0, 35.0),
-            ('шоколад молочный', 535, 7.0, 29.7, 59.4),
-            ('мед натуральный', 304, 0.3, 0.0, 82.4),
-            ('зефир', 326, 0.8, 0.1, 79.8),
-            ('халва подсолнечная', 523, 11.6, 29.7, 54.0),
-            ('чизкейк нью-йорк', 321, 5.5, 22.5, 25.0),
-            ('тирамису', 354, 4.2, 25.0, 28.0),
-            ('эклер с кремом', 330, 5.4, 20.0, 32.0),
-            ('мороженое пломбир', 230, 3.7, 15.0, 20.0),
-
-            # --- НАПИТКИ ---
-            ('кофе черный (б/с)', 2, 0.2, 0.0, 0.3),
-            ('капучино (б/с)', 35, 2.0, 2.1, 3.1),
-            ('латте (б/с)', 40, 2.6, 2.5, 4.1),
-            ('чай черный/зеленый (б/с)', 1, 0.1, 0.0, 0.2),
-            ('кола (классическая)', 42, 0.0, 0.0, 10.6),
-            ('кола зеро', 0, 0.0, 0.0, 0.0),
-            ('сок яблочный', 46, 0.4, 0.1, 11.3),
-            ('пиво светлое', 43, 0.4, 0.0, 3.6),
-            ('вино красное сухое', 68, 0.2, 0.0, 0.3),
-            ('водка/виски (40%)', 235, 0.0, 0.0, 0.1),
-            ('вода питьевая/минеральная', 0, 0.0, 0.0, 0.0),
-            ('чай с сахаром (1 ч.л.)', 25, 0.1, 0.0, 6.0),
-
-            # --- СОУСЫ И ДОБАВКИ ---
-            ('майонез 67%', 624, 2.4, 67.0, 3.9),
-            ('кетчуп', 110, 1.2, 0.1, 26.0),
-            ('соевый соус', 53, 8.1, 0.0, 4.9),
-            ('горчица', 162, 9.5, 6.4, 15.8),
-            ('масло оливковое', 884, 0.0, 100.0, 0.0),
-
-            # --- ХЛЕБ И ВЫПЕЧКА ---
-            ('хлеб бородинский', 201, 6.8, 1.3, 39.8),
-            ('хлеб пшеничный (батон)', 264, 7.5, 2.9, 51.0),
-            ('хлеб ржаной', 259, 8.5, 3.3, 48.3),
-            ('чиабатта', 262, 8.0, 1.0, 54.0),
-            ('лаваш тонкий (армянский)', 236, 7.9, 1.0, 47.6),
-            ('круассан классический (б/н)', 406, 8.2, 21.0, 45.8),
-            ('хлебцы цельнозерновые', 310, 10.0, 2.0, 62.0),
-
-            # --- ПРОЧЕЕ ---
-            ('протеин сывороточный (порошок)', 390, 75.0, 5.0, 10.0),
-            ('батончик протеиновый (60г)', 210, 20.0, 7.0, 15.0),
-            ('желатин пищевой', 355, 87.2, 0.4, 0.7),
-            ('водоросли нори', 200, 24.0, 0.0, 40.0),
-            ('мясо краба (натуральное)', 96, 18.0, 1.5, 0.0),
-            ('драгонфрут (питахайя)', 50, 1.2, 0.4, 11.0)
-        ]
-        
-        cur.executemany("""
-            INSERT INTO foods (name, kcal, protein, fat, carbs) 
-            VALUES (?, ?, ?, ?, ?)
-        """, big_foods_list)
-        
+def apply_builtin_catalog(conn):
+    """Сливает встроенный каталог с foods, если он изменился; True — если применяли.
+
+    Трогает только строки source='builtin': продукт пользователя или импорта
+    с тем же названием остается как есть, а убранные из каталога
+    встроенные строки удаляются.
+    """
+    rows = catalog_rows()
+    checksum = catalog_checksum(rows)
+    if get_meta(conn, 'builtin_catalog_checksum') == checksum:
+        return False
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("""
+            INSERT INTO foods (name, kcal, protein, fat, carbs, source)
+            VALUES (?, ?, ?, ?, ?, 'builtin')
+            ON CONFLICT (name) DO UPDATE SET
+                kcal = excluded.kcal,
+                protein = excluded.protein,
+                fat = excluded.fat,
+                carbs = excluded.carbs
+            WHERE foods.source = 'builtin'
+        """, rows)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS builtin_names (name TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.builtin_names")
+        conn.executemany("INSERT OR IGNORE INTO temp.builtin_names VALUES (?)", [(row[0],) for row in rows])
+        removed = conn.execute("""
+            DELETE FROM foods
+            WHERE source = 'builtin' AND name NOT IN (SELECT name FROM temp.builtin_names)
+        """).rowcount
+        set_meta(conn, 'builtin_catalog_version', CATALOG_VERSION)
+        set_meta(conn, 'builtin_catalog_checksum', checksum)
+        bump_catalog_rev(conn)
         conn.commit()
-        print(f"База данных успешно наполнена. Добавлено {len(big_foods_list)} продуктов.")
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"Встроенный каталог v{CATALOG_VERSION} применен: {len(rows)} продуктов, удалено устаревших {removed}")
+    return True
+
+# --- СЛУЖЕБНЫЕ ЗНАЧЕНИЯ (meta) ---
+def get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
 
-    conn.close()
+def set_meta(conn, key, value):
+    """Без commit: вызывается внутри транзакции изменения"""
+    conn.execute("""
+        INSERT INTO meta (key, value) VALUES (?, ?)
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value
+    """, (key, str(value)))
+
+def bump_catalog_rev(conn):
+    """Отмечает массовое изменение каталога (без commit)"""
+    set_meta(conn, 'catalog_rev', int(get_meta(conn, 'catalog_rev') or 0) + 1)
 
 # --- ПОИСК ПРОДУКТОВ ---
+_index_build_lock = threading.Lock()
+_index_checked_at = 0.0
+
+def load_food_index():
+    """Строит индекс продуктов в памяти из таблицы foods"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    # Ревизию и строки читаем одним снимком, чтобы не пропустить импорт между ними
+    cur.execute("BEGIN")
+    try:
+        rev = get_meta(conn, 'catalog_rev')
+        cur.execute("SELECT id, name, kcal, protein, fat, carbs FROM foods")
+        rows = cur.fetchall()
+    finally:
+        conn.commit()
+    food_index.build(rows, rev)
+
+def _refresh_food_index():
+    """Готов ли индекс к поиску.
+
+    Строит индекс при первом поиске и перестраивает после импорта (проверка
+    не чаще FOOD_INDEX_REFRESH). Индекс строит один поток; пока первая сборка
+    не закончилась, остальные ищут через SQL, а не ждут.
+    """
+    global _index_checked_at
+    if food_index.loaded:
+        now = time.monotonic()
+        if now - _index_checked_at < FOOD_INDEX_REFRESH:
+            return True
+        _index_checked_at = now
+        if get_meta(get_db_connection(), 'catalog_rev') == food_index.rev:
+            return True
+    if not _index_build_lock.acquire(blocking=False):
+        return food_index.loaded
+    try:
+        load_food_index()
+        _index_checked_at = time.monotonic()
+    finally:
+        _index_build_lock.release()
+    return True
+
+def warm_food_index():
+    """Сборка индекса при старте (в фоне), чтобы первый поиск не ждал"""
+    if food_index.loaded:
+        return
+    started = time.perf_counter()
+    if _refresh_food_index():
+        print(f"Индекс продуктов построен: {len(food_index)} продуктов за {time.perf_counter() - started:.2f} с")
+
 def search_foods(query):
     conn = get_db_connection()
     cursor = conn.cursor()
+    if not _refresh_food_index():
+        # Индекс еще строится — полный скан по подстроке
+        cursor.execute("""
+            SELECT id, name, kcal, protein, fat, carbs FROM foods 
+            WHERE LOWER(name) LIKE ? 
+            ORDER BY LENGTH(name) ASC 
+            LIMIT 10
+        """, ('%' + query.lower() + '%',))
+        return cursor.fetchall()
+
+    results = food_index.search(query)
+    if results:
+        return results
+
+    # Промах индекса: продукт мог появиться в базе в обход него (другой процесс,
+    # скрипт). Такие строки новее индекса, поэтому смотрим только id > max_id —
+    # короткий диапазон первичного ключа, а не скан всего каталога
     cursor.execute("""
         SELECT id, name, kcal, protein, fat, carbs FROM foods 
-        WHERE LOWER(name) LIKE ? 
+        WHERE id > ? AND LOWER(name) LIKE ? 
         ORDER BY LENGTH(name) ASC 
         LIMIT 10
-    """, ('%' + query.lower() + '%',))
+    """, (food_index.max_id, '%' + query.lower() + '%'))
     results = cursor.fetchall()
-    conn.close()
-    return results
+    for row in results:
+        food_index.add(row)
+    if results:
+        return results
+
+    # Ничего не нашлось — пробуем нечеткий поиск (опечатки)
+    return food_index.fuzzy_search(query, FUZZY_THRESHOLD)
+
+def search_foods_many(queries):
+    """Поиск сразу нескольких продуктов за один заход в пул: список результатов по запросам"""
+    return [search_foods(query) for query in queries]
 
 def get_food_by_id(food_id: int):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM foods WHERE id = ?", (food_id,))
     result = cursor.fetchone()
-    conn.close()
     return result
 
 # --- ПОЛЬЗОВАТЕЛИ ---
 def upsert_user_profile(user_id, gender, age, height, weight, activity_text, daily_norm):
     conn = get_db_connection()
     cur = conn.cursor()
+    # ON CONFLICT вместо INSERT OR REPLACE: служебные колонки строки не сбрасываются
     cur.execute("""
-        INSERT OR REPLACE INTO users (user_id, age, weight, height, gender, activity, daily_norm)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (user_id, age, weight, height, gender, activity_text, daily_norm))
+        INSERT INTO users (user_id, age, weight, height, gender, activity, daily_norm, timezone)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            age = excluded.age,
+            weight = excluded.weight,
+            height = excluded.height,
+            gender = excluded.gender,
+            activity = excluded.activity,
+            daily_norm = excluded.daily_norm,
+            is_active = 1
+        RETURNING *
+    """, (user_id, age, weight, height, gender, activity_text, daily_norm, DEFAULT_TIMEZONE))
+    profile = cur.fetchone()
+    # Новому пользователю — напоминания по умолчанию (если своих еще нет)
+    cur.execute("SELECT 1 FROM reminder_times WHERE user_id = ? LIMIT 1", (user_id,))
+    if cur.fetchone() is None:
+        cur.executemany(
+            "INSERT INTO reminder_times (user_id, timezone, minute) VALUES (?, ?, ?)",
+            [(user_id, profile['timezone'], minute) for minute in parse_reminder_times(DEFAULT_REMINDER_TIMES)]
+        )
     conn.commit()
-    conn.close()
+    profile_cache.set(user_id, profile)
     return daily_norm
 
+def get_reminder_user_ids(timezone, minute, cutoff, after_user_id, limit):
+    """Следующая пачка пользователей корзины (timezone, minute), не евших после cutoff.
+
+    Постранично по индексу (timezone, minute, user_id); активность и время
+    последней записи проверяются по первичному ключу users.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT r.user_id FROM reminder_times r
+        JOIN users u ON u.user_id = r.user_id
+        WHERE r.timezone = ? AND r.minute = ? AND r.user_id > ?
+          AND u.is_active = 1 AND u.last_log_at < ?
+        ORDER BY r.user_id
+        LIMIT ?
+    """, (timezone, minute, after_user_id, cutoff, limit))
+    return [row['user_id'] for row in cur.fetchall()]
+
+def get_reminder_buckets():
+    """Все непустые корзины напоминаний: пары (timezone, minute)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT timezone, minute FROM reminder_times")
+    return [(row['timezone'], row['minute']) for row in cur.fetchall()]
+
+def get_reminder_settings(user_id):
+    """Часовой пояс пользователя и его напоминания (минуты от местной полуночи)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT timezone FROM users WHERE user_id = ?", (user_id,))
+    user = cur.fetchone()
+    if user is None:
+        return None, []
+    cur.execute("SELECT minute FROM reminder_times WHERE user_id = ? ORDER BY minute", (user_id,))
+    return user['timezone'], [row['minute'] for row in cur.fetchall()]
+
+def set_reminder_times(user_id, minutes):
+    """Заменяет все напоминания пользователя; пустой список — выключить"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM reminder_times WHERE user_id = ?", (user_id,))
+    cur.executemany("""
+        INSERT OR IGNORE INTO reminder_times (user_id, timezone, minute)
+        SELECT user_id, timezone, ? FROM users WHERE user_id = ?
+    """, [(minute, user_id) for minute in minutes])
+    conn.commit()
+
+def set_user_timezone(user_id, timezone):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE users SET timezone = ? WHERE user_id = ? RETURNING *", (timezone, user_id))
+    profile = cur.fetchone()
+    cur.execute("UPDATE reminder_times SET timezone = ? WHERE user_id = ?", (timezone, user_id))
+    conn.commit()
+    profile_cache.set(user_id, profile)
+
+def deactivate_users(user_ids):
+    """Помечает пользователей, заблокировавших бота"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.executemany("UPDATE users SET is_active = 0 WHERE user_id = ?", [(uid,) for uid in user_ids])
+    conn.commit()
+    for uid in user_ids:
+        profile_cache.pop(uid)
+
 def get_user_profile(user_id):
+    user = profile_cache.get(user_id)
+    if user is not MISSING:
+        return user
+    token = profile_cache.token()
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
     user = cur.fetchone()
-    conn.close()
+    profile_cache.fill(user_id, user, token)
     return user
 
 # --- ЛОГИ (ПРИЕМЫ ПИЩИ) ---
-def log_meal(user_id, kcal, p, f, c, details, meal_name="Прием пищи"):
+def log_meal(user_id, kcal, p, f, c, details, meal_name="Прием пищи", items=()):
+    """items — позиции приема: (food_id, название, граммы, ккал, белки, жиры, углеводы)"""
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("""
         INSERT INTO logs (user_id, kcal, protein, fat, carbs, details, meal_name)
         VALUES (?, ?, ?, ?, ?, ?, ?)
     """, (user_id, kcal, p, f, c, details, meal_name))
+    log_id = cur.lastrowid
+    # Дневной итог обновляем в той же транзакции и с той же датой, что у записи лога
+    cur.execute("""
+        INSERT INTO daily_totals (user_id, date, kcal, protein, fat, carbs, meals)
+        SELECT user_id, date, kcal, protein, fat, carbs, 1 FROM logs WHERE id = ?
+        ON CONFLICT (user_id, date) DO UPDATE SET
+            kcal = kcal + excluded.kcal,
+            protein = protein + excluded.protein,
+            fat = fat + excluded.fat,
+            carbs = carbs + excluded.carbs,
+            meals = meals + 1
+        RETURNING date, kcal, protein, fat, carbs
+    """, (log_id,))
+    totals = cur.fetchone()
+    # Позиции — в той же транзакции, с датой записи лога
+    cur.executemany("""
+        INSERT INTO meal_items (log_id, user_id, date, food_id, name, grams, kcal, protein, fat, carbs)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(log_id, user_id, totals['date'], *item) for item in items])
+    # Время последней записи нужно напоминаниям, чтобы не писать тем, кто недавно ел
+    cur.execute("""
+        UPDATE users SET last_log_at = (SELECT timestamp FROM logs WHERE id = ?)
+        WHERE user_id = ?
+        RETURNING *
+    """, (log_id, user_id))
+    user = cur.fetchone()
     conn.commit()
-    conn.close()
+    # Кэш получает итоги под датой самой записи (запись в 23:59 не попадет в завтра)
+    day_totals = _totals_dict(totals)
+    totals_cache.set((user_id, totals['date']), day_totals)
+    if user is not None:
+        profile_cache.set(user_id, user)
+    record_frequent_foods(user_id, [item[:3] for item in items], time.time())
+    # Итоги дня из той же транзакции — после записи не нужно перечитывать статистику
+    return {**day_totals, 'daily_norm': user['daily_norm'] if user else None}
 
-def get_daily_logs(user_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
+def _add_usage(foods, food_id, name, score, grams):
+    entry = foods.get(food_id)
+    if entry is None:
+        foods[food_id] = [name, score, grams]
+    else:
+        entry[1] += score
+        entry[2] += grams
+
+def record_frequent_foods(user_id, items, timestamp):
+    """items — (food_id, название, граммы); пишется только в память, в базу — при сбросе"""
+    weight = usage_weight(timestamp)
+    with _frequent_lock:
+        pending = _frequent_pending.setdefault(user_id, {})
+        cached = frequent_cache.get(user_id)
+        for food_id, name, grams in items:
+            if food_id is None:
+                continue
+            _add_usage(pending, food_id, name, weight, grams * weight)
+            if cached is not MISSING:
+                _add_usage(cached, food_id, name, weight, grams * weight)
+
+def get_frequent_foods(user_id, limit):
+    """Самые частые продукты пользователя с учетом давности: id, название и привычная порция"""
+    with _frequent_lock:
+        foods = frequent_cache.get(user_id)
+        if foods is MISSING:
+            conn = get_db_connection()
+            # Название — текущее из foods: продукт могли переименовать
+            foods = {row['food_id']: [row['name'], row['score'], row['grams']] for row in conn.execute("""
+                SELECT uf.food_id, f.name, uf.score, uf.grams
+                FROM user_foods uf JOIN foods f ON f.id = uf.food_id
+                WHERE uf.user_id = ?
+            """, (user_id,))}
+            for food_id, (name, score, grams) in _frequent_pending.get(user_id, {}).items():
+                _add_usage(foods, food_id, name, score, grams)
+            frequent_cache.set(user_id, foods)
+        return _top_frequent(foods, limit)
+
+def cached_frequent_foods(user_id, limit):
+    """То же из кэша, без базы и без ожидания замка; None — идти в get_frequent_foods"""
+    if not _frequent_lock.acquire(blocking=False):
+        return None
+    try:
+        foods = frequent_cache.get(user_id)
+        return None if foods is MISSING else _top_frequent(foods, limit)
+    finally:
+        _frequent_lock.release()
+
+def _top_frequent(foods, limit):
+    top = sorted(foods.items(), key=lambda item: -item[1][1])[:limit]
+    return [{'id': food_id, 'name': name, 'grams': grams / score}
+            for food_id, (name, score, grams) in top]
+
+def flush_frequent_foods():
+    """Сбрасывает накопленные приращения в user_foods одной транзакцией"""
+    with _frequent_lock:
+        if not _frequent_pending:
+            return 0
+        rows = [(user_id, food_id, score, grams)
+                for user_id, foods in _frequent_pending.items()
+                for food_id, (_, score, grams) in foods.items()]
+        conn = get_db_connection()
+        try:
+            conn.executemany("""
+                INSERT INTO user_foods (user_id, food_id, score, grams) VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id, food_id) DO UPDATE SET
+                    score = score + excluded.score,
+                    grams = grams + excluded.grams
+            """, rows)
+            conn.commit()
+        except sqlite3.Error:
+            # Приращения остаются в памяти до следующей попытки
+            conn.rollback()
+            raise
+        _frequent_pending.clear()
+    return len(rows)
+
+def _read_daily_logs(cur, user_id, today):
     cur.execute("""
         SELECT kcal, protein, fat, carbs, details, meal_name,
                strftime('%H:%M', timestamp) as meal_time
         FROM logs 
-        WHERE user_id = ? AND date = date('now', 'localtime')
+        WHERE user_id = ? AND date = ?
         ORDER BY timestamp ASC
-    """, (user_id,))
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    """, (user_id, today))
+    return cur.fetchall()
 
-def get_daily_stats(user_id):
+def get_daily_logs(user_id):
     conn = get_db_connection()
     cur = conn.cursor()
+    return _read_daily_logs(cur, user_id, _today())
+
+def _read_daily_totals(cur, user_id, today):
     cur.execute("""
-        SELECT SUM(kcal) as total_kcal, 
-               SUM(protein) as total_prot, 
-               SUM(fat) as total_fat, 
-               SUM(carbs) as total_carb
-        FROM logs 
-        WHERE user_id = ? AND date = date('now', 'localtime')
-    """, (user_id,))
-    stats = cur.fetchone()
-    conn.close()
+        SELECT kcal, protein, fat, carbs
+        FROM daily_totals 
+        WHERE user_id = ? AND date = ?
+    """, (user_id, today))
+    return _totals_dict(cur.fetchone())
+
+def get_daily_stats(user_id):
+    today = _today()
+    stats = totals_cache.get((user_id, today))
+    if stats is not MISSING:
+        return stats
+    token = totals_cache.token()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    stats = _read_daily_totals(cur, user_id, today)
+    totals_cache.fill((user_id, today), stats, token)
     return stats
 
+def get_history(user_id, days):
+    """Дневные итоги за последние days дней (включая сегодня), по возрастанию даты"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT date, kcal, protein, fat, carbs, meals
+        FROM daily_totals
+        WHERE user_id = ? AND date >= date('now', 'localtime', ?)
+        ORDER BY date ASC
+    """, (user_id, f'-{days - 1} days'))
+    return cur.fetchall()
+
+def get_top_foods(user_id, days, limit=10):
+    """Самые частые продукты за последние days дней: сколько раз, граммы и калории"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    # Диапазон (user_id, date) индекса ix_meal_items_user_date; позиции без
+    # food_id (не нашлись при переносе старых записей) группируются по названию
+    cur.execute("""
+        SELECT COALESCE(f.name, mi.name) AS name, COUNT(*) AS times,
+               TOTAL(mi.grams) AS grams, TOTAL(mi.kcal) AS kcal
+        FROM meal_items mi
+        LEFT JOIN foods f ON f.id = mi.food_id
+        WHERE mi.user_id = ? AND mi.date >= date('now', 'localtime', ?)
+        GROUP BY COALESCE(mi.food_id, mi.name)
+        ORDER BY times DESC, grams DESC
+        LIMIT ?
+    """, (user_id, f'-{days - 1} days', limit))
+    return cur.fetchall()
+
+def get_daily_snapshot(user_id):
+    """Профиль, сегодняшние приемы пищи и итоги дня одним согласованным чтением"""
+    today = _today()
+    profile = profile_cache.get(user_id)
+    totals = totals_cache.get((user_id, today))
+    conn = get_db_connection()
+    cur = conn.cursor()
+    if profile is not MISSING and totals is not MISSING:
+        # Профиль и итоги уже в кэше; без записей за день и логи читать незачем
+        return {'profile': profile, 'logs': _read_daily_logs(cur, user_id, today) if totals else [],
+                'totals': totals}
+    profile_token, totals_token = profile_cache.token(), totals_cache.token()
+    cur.execute("BEGIN")
+    try:
+        cur.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        profile = cur.fetchone()
+        logs = _read_daily_logs(cur, user_id, today)
+        totals = _read_daily_totals(cur, user_id, today)
+    finally:
+        conn.commit()
+    profile_cache.fill(user_id, profile, profile_token)
+    totals_cache.fill((user_id, today), totals, totals_token)
+    return {'profile': profile, 'logs': logs, 'totals': totals}
+
 def reset_user_data(user_id):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
     cur.execute("DELETE FROM logs WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    cur.execute("DELETE FROM daily_totals WHERE user_id = ?", (user_id,))
+    cur.execute("DELETE FROM meal_items WHERE user_id = ?", (user_id,))
+    cur.execute("DELETE FROM reminder_times WHERE user_id = ?", (user_id,))
+    with _frequent_lock:
+        cur.execute("DELETE FROM user_foods WHERE user_id = ?", (user_id,))
+        conn.commit()
+        _frequent_pending.pop(user_id, None)
+        frequent_cache.pop(user_id)
+    profile_cache.set(user_id, None)
+    totals_cache.set((user_id, _today()), None)
     return True
 def add_custom_food(name, kcal, protein, fat, carbs):
     """Добавляет пользовательский продукт в базу данных"""
     conn = get_db_connection()
     cur = conn.cursor()
     
-    # Нормализация имени: нижний регистр + убираем лишние пробелы
-    normalized_name = ' '.join(name.lower().split())
+    # Нормализация имени: нижний регистр, ё -> е, убираем лишние пробелы
+    normalized_name = normalize_name(name)
     
     try:
         cur.execute("""
-            INSERT INTO foods (name, kcal, protein, fat, carbs)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO foods (name, kcal, protein, fat, carbs, source)
+            VALUES (?, ?, ?, ?, ?, 'custom')
         """, (normalized_name, kcal, protein, fat, carbs))
         conn.commit()
+        if food_index.loaded:
+            food_index.add({'id': cur.lastrowid, 'name': normalized_name, 'kcal': kcal,
+                            'protein': protein, 'fat': fat, 'carbs': carbs})
         print(f"Добавлен продукт: {normalized_name}")
         return True
     except sqlite3.IntegrityError:
+        # Соединение долгоживущее — не оставляем висящую транзакцию
+        conn.rollback()
         print(f"Продукт '{normalized_name}' уже существует")
         return False
-    finally:
-        conn.close()
+
+# --- СОСТОЯНИЯ FSM ---
+def load_fsm_state(key):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT state, data FROM fsm_states WHERE key = ?", (key,))
+    return cur.fetchone()
+
+def save_fsm_states(upserts, deletes):
+    """Пакетная запись состояний одной транзакцией: upserts — [(key, state, data_json)]"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO fsm_states (key, state, data, updated_at)
+        VALUES (?, ?, ?, datetime('now', 'localtime'))
+        ON CONFLICT (key) DO UPDATE SET
+            state = excluded.state,
+            data = excluded.data,
+            updated_at = excluded.updated_at
+    """, upserts)
+    cur.executemany("DELETE FROM fsm_states WHERE key = ?", [(key,) for key in deletes])
+    conn.commit()
+
+def _idle_modifier(idle_ttl):
+    # updated_at хранится местным временем, сравниваем с ним же
+    return f"-{int(idle_ttl)} seconds"
+
+def get_stale_fsm_keys(idle_ttl, limit, after=('', '')):
+    """(updated_at, key) состояний, не менявшихся дольше idle_ttl секунд, — от самых давних.
+
+    after — последняя строка предыдущей страницы: следующая начнется за ней.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT updated_at, key FROM fsm_states
+        WHERE updated_at < datetime('now', 'localtime', ?) AND (updated_at, key) > (?, ?)
+        ORDER BY updated_at, key LIMIT ?
+    """, (_idle_modifier(idle_ttl), *after, limit))
+    return cur.fetchall()
+
+def take_stale_fsm_states(keys, idle_ttl):
+    """Удаляет и возвращает состояния из keys, если они все еще не менялись дольше idle_ttl.
+
+    Удаление с RETURNING гарантирует, что одну сессию заберет только один
+    процесс, даже если очистка идет в нескольких воркерах.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    rows = []
+    for key in keys:
+        cur.execute("""
+            DELETE FROM fsm_states
+            WHERE key = ? AND updated_at < datetime('now', 'localtime', ?)
+            RETURNING key, state, data
+        """, (key, _idle_modifier(idle_ttl)))
+        row = cur.fetchone()
+        if row is not None:
+            rows.append(row)
+    conn.commit()
+    return rows
+
+# --- АРЕНДЫ (LEASES) ---
+def try_acquire_lease(name, owner, ttl):
+    """Захватывает именованную аренду на ttl секунд; True, если она наша.
+
+    Нужна, чтобы задачу (например, рассылку корзины напоминаний) выполнил
+    ровно один процесс, даже если планировщик запущен в нескольких.
+    """
+    now = time.time()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            owner = excluded.owner,
+            expires_at = excluded.expires_at
+        WHERE leases.expires_at < ? OR leases.owner = excluded.owner
+    """, (name, owner, now + ttl, now))
+    acquired = cur.rowcount == 1
+    conn.commit()
+    return acquired
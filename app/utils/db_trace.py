@@ -0,0 +1,187 @@
+"""Трассировка SQL-запросов (включается DB_TRACE=1).
+
+Соединение с фабрикой TracingConnection отдает курсоры, которые для каждого
+выражения меряют полное время — execute и чтение строк — и число строк
+(для SELECT — прочитанных, для INSERT/UPDATE/DELETE — измененных).
+Параметры в лог не попадают, только их форма: "(int, str)", "{user_id: int}",
+"500 × (int, float)" для executemany.
+
+Выражения дольше DB_SLOW_QUERY_MS пишутся в лог с уровнем WARNING,
+с DB_EXPLAIN_SLOW=1 — вместе с EXPLAIN QUERY PLAN (один раз на текст
+запроса): "SCAN logs" вместо "SEARCH logs USING INDEX" сразу показывает
+недостающий индекс. Курсор, прочитанный не до конца, отчитывается из
+сборщика мусора: там соединение не трогаем, и медленное выражение попадает
+в лог при следующем запросе того же потока. Сводка по всем выражениям —
+query_stats().
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+from config import DB_SLOW_QUERY_MS, DB_EXPLAIN_SLOW
+
+logger = logging.getLogger(__name__)
+
+# Для этих выражений план не строится
+_NO_PLAN = ('PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'CREATE', 'DROP', 'ANALYZE')
+
+_stats_lock = threading.Lock()
+_stats = {}  # текст запроса -> [вызовов, суммарно секунд, максимум секунд, строк]
+_explained = set()
+# Медленные выражения, закрытые сборщиком мусора: логируются при следующем запросе потока
+_deferred = threading.local()
+
+def _compact(sql: str) -> str:
+    return " ".join(sql.split())
+
+def params_shape(params, many: bool = False) -> str:
+    """Типы параметров без значений"""
+    if many:
+        params = list(params)
+        return f"{len(params)} × {params_shape(params[0])}" if params else "0 × ()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+
+def _record(sql: str, seconds: float, rows: int):
+    with _stats_lock:
+        entry = _stats.get(sql)
+        if entry is None:
+            entry = _stats[sql] = [0, 0.0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        entry[3] += rows
+
+def query_stats(limit: int = 20) -> list[dict]:
+    """Самые затратные выражения по суммарному времени"""
+    with _stats_lock:
+        items = sorted(_stats.items(), key=lambda item: -item[1][1])[:limit]
+    return [{
+        'sql': sql, 'calls': calls, 'total_ms': total * 1000,
+        'avg_ms': total / calls * 1000, 'max_ms': longest * 1000, 'rows': rows,
+    } for sql, (calls, total, longest, rows) in items]
+
+def log_summary(limit: int = 10):
+    for entry in query_stats(limit):
+        logger.info("SQL %(calls)s раз, всего %(total_ms).0f мс, среднее %(avg_ms).2f мс, "
+                    "максимум %(max_ms).1f мс, строк %(rows)s: %(sql)s", entry)
+
+def _log_slow(conn, sql, elapsed, rows, shape, params, many):
+    logger.warning("Медленный запрос %.1f мс, строк %s, параметры %s: %s", elapsed * 1000, rows, shape, sql)
+    if not DB_EXPLAIN_SLOW or sql in _explained or sql.upper().startswith(_NO_PLAN) or many:
+        return
+    _explained.add(sql)
+    try:
+        # Отдельным курсором без трассировки, на том же соединении и с теми же параметрами
+        plan = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error as e:
+        logger.warning("EXPLAIN QUERY PLAN не удался: %s", e)
+        return
+    logger.warning("План запроса:\n%s", "\n".join(f"  {row[3]}" for row in plan))
+
+class TracingCursor(sqlite3.Cursor):
+    _sql = None
+
+    def _finish(self, collected: bool = False):
+        # Выражение закончено: прочитаны все строки, начато следующее или курсор закрыт
+        sql, self._sql = self._sql, None
+        if sql is None:
+            return
+        rows = self.rowcount if self.rowcount >= 0 else self._rows
+        _record(sql, self._elapsed, rows)
+        if self._elapsed * 1000 >= DB_SLOW_QUERY_MS:
+            slow = (sql, self._elapsed, rows, self._shape, self._params, self._many)
+            if collected:
+                # Из сборщика мусора соединение может быть посреди чужой транзакции
+                # или уже закрыто (выход интерпретатора): только запоминаем
+                if not hasattr(_deferred, "slow"):
+                    _deferred.slow = []
+                _deferred.slow.append(slow)
+            else:
+                _log_slow(self.connection, *slow)
+
+    def _log_deferred(self):
+        slow = getattr(_deferred, "slow", None)
+        if slow:
+            _deferred.slow = []
+            for entry in slow:
+                _log_slow(self.connection, *entry)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def execute(self, sql, params=()):
+        self._finish()
+        self._log_deferred()
+        self._sql, self._shape, self._params, self._many = _compact(sql), params_shape(params), params, False
+        self._elapsed, self._rows = 0.0, 0
+        self._timed(super().execute, sql, params)
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._finish()
+        self._log_deferred()
+        seq_of_params = list(seq_of_params)
+        self._sql, self._shape, self._params, self._many = _compact(sql), params_shape(seq_of_params, True), None, True
+        self._elapsed, self._rows = 0.0, 0
+        self._timed(super().executemany, sql, seq_of_params)
+        if self.description is None:
+            self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if self._sql is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if self._sql is not None:
+            self._rows += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._sql is not None:
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Курсоры, прочитанные не до конца (execute(...).fetchone()), отчитываются здесь
+        self._finish(collected=True)
+
+class TracingConnection(sqlite3.Connection):
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    # В C-реализации Connection.execute создает обычный курсор, минуя cursor()
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
@@ -0,0 +1,149 @@
+"""Массовая рассылка с ограничением скорости.
+
+Получатели читаются из базы пачками, отправка идет в несколько корутин под
+общим token bucket (лимит Telegram ~30 сообщений/с). RetryAfter ставит на
+паузу всю рассылку и повторяет сообщение, заблокировавшие бота пользователи
+помечаются неактивными.
+"""
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from .async_database import deactivate_users
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Общий лимит скорости: rate токенов в секунду, запас не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов (ответ RetryAfter от Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class FanoutStats:
+    def __init__(self):
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+        self.retried = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def __str__(self):
+        rate = self.sent / self.elapsed if self.elapsed > 0 else 0
+        return (f"отправлено {self.sent}, заблокировали бота {self.blocked}, ошибок {self.failed}, "
+                f"повторов после RetryAfter {self.retried} за {self.elapsed:.1f} с ({rate:.1f} сообщ./с)")
+
+async def fan_out(bot: Bot, user_chunks, text: str, rate: float, concurrency: int,
+                  max_attempts: int = 3, **send_kwargs) -> FanoutStats:
+    """Рассылает text всем user_id из асинхронного итератора пачек user_chunks"""
+    bucket = TokenBucket(rate)
+    stats = FanoutStats()
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    blocked = []
+    flush_at = 100
+
+    async def flush_blocked():
+        # Ошибка базы не должна ронять воркер: иначе очередь перестанет
+        # разбираться и queue.put у продюсера повиснет навсегда
+        nonlocal flush_at
+        if blocked:
+            batch = blocked[:]
+            blocked.clear()
+            try:
+                await deactivate_users(batch)
+            except Exception:
+                logger.exception("Не удалось пометить неактивными %s пользователей", len(batch))
+                # Вернем пачку и повторим, когда наберется еще сотня
+                blocked.extend(batch)
+                flush_at = len(blocked) + 100
+                return
+            flush_at = 100
+
+    async def send(user_id):
+        for attempt in range(max_attempts):
+            await bucket.acquire()
+            try:
+                await bot.send_message(user_id, text, **send_kwargs)
+                stats.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                # Флуд-контроль общий для бота: тормозим всех и пробуем снова
+                bucket.pause(e.retry_after)
+                stats.retried += 1
+            except TelegramForbiddenError:
+                stats.blocked += 1
+                blocked.append(user_id)
+                return
+            except TelegramBadRequest as e:
+                if "chat not found" in str(e).lower():
+                    stats.blocked += 1
+                    blocked.append(user_id)
+                else:
+                    stats.failed += 1
+                    logger.warning("Не удалось отправить сообщение %s: %s", user_id, e)
+                return
+            except Exception as e:
+                stats.failed += 1
+                logger.warning("Не удалось отправить сообщение %s: %s", user_id, e)
+                return
+        stats.failed += 1
+        logger.warning("Сообщение %s не отправлено после %s попыток", user_id, max_attempts)
+
+    async def worker():
+        while True:
+            user_id = await queue.get()
+            try:
+                if user_id is None:
+                    return
+                await send(user_id)
+                if len(blocked) >= flush_at:
+                    await flush_blocked()
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        async for chunk in user_chunks:
+            for user_id in chunk:
+                await queue.put(user_id)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await flush_blocked()
+
+    logger.info("Рассылка завершена: %s", stats)
+    return stats
@@ -0,0 +1,204 @@
+"""Индекс продуктов в памяти процесса.
+
+Заменяет полный скан `LOWER(name) LIKE '%q%'` на каждый запрос:
+названия нормализуются один раз, по триграммам строятся списки id,
+а поиск подстроки сводится к пересечению нескольких множеств.
+
+Для опечаток ("курца", "гречька") есть нечеткий поиск: слова запроса
+сравниваются по триграммам со словарем слов каталога, а не со всеми
+продуктами, поэтому его стоимость растет со словарем, а не с каталогом.
+"""
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+FOOD_FIELDS = ('id', 'name', 'kcal', 'protein', 'fat', 'carbs')
+
+def normalize_name(name: str) -> str:
+    """Нижний регистр, ё -> е и схлопывание пробелов"""
+    return ' '.join(name.lower().replace('ё', 'е').split())
+
+def _grams(text: str, n: int):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def _words(norm: str):
+    return set(re.findall(r'\w{2,}', norm))
+
+def _word_grams(word: str):
+    # Как в pg_trgm: начало слова весит больше, чем конец
+    return _grams(f'  {word} ', 3)
+
+def similarity(a: str, b: str) -> float:
+    """Триграммное сходство двух слов (коэффициент Жаккара)"""
+    ga, gb = _word_grams(a), _word_grams(b)
+    shared = len(ga & gb)
+    return shared / (len(ga) + len(gb) - shared)
+
+class FoodIndex:
+    def __init__(self):
+        self.loaded = False
+        self.rev = None                   # catalog_rev из таблицы meta, с которым построен индекс
+        self.max_id = 0                   # наибольший id в индексе: все, что новее, добавлено в обход него
+        self._foods = {}                  # id -> строка продукта (dict)
+        self._names = {}                  # id -> нормализованное название
+        self._trigrams = defaultdict(set) # триграмма -> id продуктов
+        self._chars = defaultdict(set)    # символ -> id (для запросов короче 3 символов)
+        self._words = {}                  # слово -> [(длина названия, id)], отсортировано
+        self._word_grams = defaultdict(set) # триграмма -> слова словаря
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._foods)
+
+    def build(self, rows, rev=None):
+        """Полностью перестраивает индекс из строк таблицы foods.
+
+        Новый индекс собирается рядом и подменяет старый целиком, поэтому
+        поиск в других потоках во время перестройки видит старый каталог.
+        """
+        fresh = FoodIndex()
+        for row in rows:
+            fresh._add(row, bulk=True)
+        for postings in fresh._words.values():
+            postings.sort()
+        with self._lock:
+            self._foods = fresh._foods
+            self._names = fresh._names
+            self._trigrams = fresh._trigrams
+            self._chars = fresh._chars
+            self._words = fresh._words
+            self._word_grams = fresh._word_grams
+            self.max_id = fresh.max_id
+            self.rev = rev
+            self.loaded = True
+
+    def add(self, row):
+        """Инкрементально добавляет (или обновляет) один продукт"""
+        with self._lock:
+            self._add(row)
+
+    def _add(self, row, bulk=False):
+        food = {field: row[field] for field in FOOD_FIELDS}
+        food_id = food['id']
+        if food_id in self._names:
+            self._remove(food_id)
+        norm = normalize_name(food['name'])
+        self._foods[food_id] = food
+        self._names[food_id] = norm
+        self.max_id = max(self.max_id, food_id)
+        for gram in _grams(norm, 3):
+            self._trigrams[gram].add(food_id)
+        for char in set(norm):
+            self._chars[char].add(food_id)
+        entry = (len(food['name']), food_id)
+        for word in _words(norm):
+            postings = self._words.get(word)
+            if postings is None:
+                postings = self._words[word] = []
+                for gram in _word_grams(word):
+                    self._word_grams[gram].add(word)
+            if bulk:
+                postings.append(entry)  # отсортируем один раз в конце build()
+            else:
+                bisect.insort(postings, entry)
+
+    def _remove(self, food_id):
+        norm = self._names.pop(food_id)
+        food = self._foods.pop(food_id)
+        entry = (len(food['name']), food_id)
+        for word in _words(norm):
+            postings = self._words[word]
+            postings.remove(entry)
+            if not postings:
+                del self._words[word]
+                for gram in _word_grams(word):
+                    self._word_grams[gram].discard(word)
+        for gram in _grams(norm, 3):
+            self._trigrams[gram].discard(food_id)
+        for char in set(norm):
+            self._chars[char].discard(food_id)
+
+    def search(self, query: str, limit: int = 10):
+        """Поиск по подстроке с тем же ранжированием, что и в SQL: короткие названия выше"""
+        q = normalize_name(query)
+        if not q:
+            return []
+
+        # Ссылки берем один раз: build() может подменить словари в другом потоке
+        foods, names = self._foods, self._names
+        if len(q) >= 3:
+            keys, postings = _grams(q, 3), self._trigrams
+        else:
+            keys, postings = set(q), self._chars
+
+        # Начинаем пересечение с самого короткого списка
+        sets = sorted((postings.get(key, ()) for key in keys), key=len)
+        if not sets or not sets[0]:
+            return []
+        candidates = set(sets[0])
+        for ids in sets[1:]:
+            candidates &= ids
+            if not candidates:
+                return []
+
+        matched = [fid for fid in candidates if q in names.get(fid, '')]
+        matched.sort(key=lambda fid: (len(foods[fid]['name']), fid))
+        return [dict(foods[fid]) for fid in matched[:limit]]
+
+    def similar_words(self, word: str, threshold: float, limit: int = 5, max_posting: int = 500):
+        """Слова словаря, похожие на word, по убыванию сходства.
+
+        Слишком частые триграммы (длиннее max_posting) пропускаются, если у
+        слова есть более редкие: так число кандидатов ограничено при любом размере каталога.
+        """
+        grams = _word_grams(word)
+        shared = defaultdict(int)
+        # Под замком: add() в других потоках пула меняет эти множества, а обход
+        # изменяемого set в Python-цикле падает с "Set changed size during iteration"
+        with self._lock:
+            if word in self._words:
+                return [(word, 1.0)]
+            postings = sorted((self._word_grams.get(g, ()) for g in grams), key=len)
+            for i, words in enumerate(postings):
+                if i and len(words) > max_posting:
+                    break
+                for w in words:
+                    shared[w] += 1
+
+        scored = []
+        for w, common in shared.items():
+            # Жаккар по числу общих триграмм; у слова w их len(w) + 1
+            score = common / (len(grams) + len(w) + 1 - common)
+            if score >= threshold:
+                scored.append((score, w))
+        scored.sort(key=lambda x: (-x[0], len(x[1])))
+        return [(w, score) for score, w in scored[:limit]]
+
+    def fuzzy_search(self, query: str, threshold: float, limit: int = 10, per_word: int = 50):
+        """Поиск с опечатками: продукты, слова которых похожи на слова запроса"""
+        tokens = _words(normalize_name(query))
+        if not tokens:
+            return []
+
+        # food_id -> сумма лучших сходств по словам запроса
+        scores = defaultdict(float)
+        for token in tokens:
+            best = {}
+            for word, score in self.similar_words(token, threshold):
+                # Для каждого слова берем только самые короткие названия
+                for _, fid in self._words.get(word, ())[:per_word]:
+                    if score > best.get(fid, 0.0):
+                        best[fid] = score
+            for fid, score in best.items():
+                scores[fid] += score
+
+        foods = self._foods
+        ranked = sorted(
+            (fid for fid in scores if fid in foods),
+            key=lambda fid: (-scores[fid], len(foods[fid]['name']), fid)
+        )
+        return [dict(foods[fid]) for fid in ranked[:limit]]
+
+# Общий индекс процесса; наполняется лениво при первом поиске
+food_index = FoodIndex()
@@ -0,0 +1,18 @@
+"""Вес записи для счетчиков частых продуктов (user_foods).
+
+Счетчик продукта — сумма весов всех его записей, а вес записи в момент t
+равен 2 ** ((t - EPOCH) / HALF_LIFE). Так каждая новая запись весит вдвое
+больше, чем сделанная HALF_LIFE_DAYS дней назад, то есть старые привычки
+"затухают", но хранить и обновлять нужно только сумму: счетчики лишь
+растут и складываются (в том числе в upsert при сбросе на диск), а порядок
+продуктов одного пользователя тот же, что у честно затухающих значений.
+
+При периоде 14 дней float хватает примерно на 39 лет от EPOCH.
+"""
+import datetime
+
+HALF_LIFE_DAYS = 14
+EPOCH = datetime.datetime(2024, 1, 1).timestamp()
+
+def usage_weight(timestamp: float) -> float:
+    return 2.0 ** ((timestamp - EPOCH) / (HALF_LIFE_DAYS * 86400))
@@ -0,0 +1,386 @@
+"""Хранилище FSM aiogram поверх нашей базы SQLite.
+
+Горячие состояния живут в словаре процесса, поэтому чтение и запись
+состояния внутри апдейта не трогают диск. Изменения копятся и пишутся
+в таблицу fsm_states пачкой (write-behind) раз в FSM_FLUSH_INTERVAL
+секунд; после рестарта состояние подгружается из базы при первом обращении.
+
+EvictingStorage ограничивает число сессий в памяти: брошенные (без
+обращений дольше TTL) сбрасываются, лишние сверх лимита вытесняются.
+Сессии, которых в памяти уже нет (вытесненные или оставшиеся с прошлого
+запуска), разбираются прямо в базе по updated_at.
+"""
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Mapping
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import (
+    FSM_FLUSH_INTERVAL, FSM_FLUSH_BATCH,
+    FSM_IDLE_TTL, FSM_MAX_SESSIONS, FSM_SWEEP_INTERVAL, FSM_SWEEP_BATCH,
+)
+from . import database as db
+from .async_database import load_fsm_state, get_stale_fsm_keys, take_stale_fsm_states, run_db
+
+logger = logging.getLogger(__name__)
+
+# Сколько страниц брошенных сессий из базы просматривать за один проход
+# (чужие для воркера кластера строки пропускаются)
+SWEEP_PAGES = 10
+
+class _Record:
+    __slots__ = ("state", "data")
+
+    def __init__(self, state=None, data=None):
+        self.state = state
+        self.data = data if data is not None else {}
+
+    @property
+    def empty(self):
+        return self.state is None and not self.data
+
+def _serialize(dirty: dict[str, _Record]):
+    """(upserts, deletes) для save_fsm_states; данные — уже строки JSON"""
+    upserts, deletes = [], []
+    for k, record in dirty.items():
+        if record.empty:
+            deletes.append(k)
+        else:
+            upserts.append((k, record.state, json.dumps(record.data, ensure_ascii=False, default=str)))
+    return upserts, deletes
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, flush_interval: float = FSM_FLUSH_INTERVAL, flush_batch: int = FSM_FLUSH_BATCH,
+                 key_builder: KeyBuilder | None = None):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache: dict[str, _Record] = {}
+        # Ключи, измененные после последней записи; ссылка на запись живет здесь,
+        # даже если ее уже вытеснили из _cache
+        self._dirty: dict[str, _Record] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._batch_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+
+    # --- кэш ---
+
+    async def _record(self, key: StorageKey) -> tuple[str, _Record]:
+        k = self.key_builder.build(key)
+        record = self._cache.get(k) or self._dirty.get(k)
+        if record is None:
+            row = await load_fsm_state(k)
+            loaded = _Record(row['state'], json.loads(row['data'])) if row else _Record()
+            # Пока ждали базу, запись могла появиться из другого апдейта
+            record = self._cache.get(k) or self._dirty.get(k) or loaded
+        self._cache[k] = record
+        return k, record
+
+    def _mark_dirty(self, k: str, record: _Record):
+        self._dirty[k] = record
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        elif len(self._dirty) >= self.flush_batch and (self._batch_task is None or self._batch_task.done()):
+            self._batch_task = asyncio.create_task(self.flush())
+
+    def evict(self, key: StorageKey):
+        """Убирает ключ из памяти; несохраненные изменения все равно будут записаны"""
+        self._cache.pop(self.key_builder.build(key), None)
+
+    def in_memory(self, k: str) -> bool:
+        return k in self._cache or k in self._dirty
+
+    def parse_key(self, k: str) -> StorageKey | None:
+        """Обратное к key_builder.build для ключей из базы; None, если формат не наш"""
+        kb = self.key_builder
+        if not (isinstance(kb, DefaultKeyBuilder) and kb.with_bot_id and kb.with_destiny) \
+                or kb.with_business_connection_id:
+            return None
+        parts = k.split(kb.separator)
+        if parts[0] != kb.prefix or len(parts) not in (5, 6):
+            return None
+        try:
+            ids = [int(part) for part in parts[1:-1]]
+        except ValueError:
+            return None
+        thread_id = ids.pop(2) if len(ids) == 4 else None
+        bot_id, chat_id, user_id = ids
+        return StorageKey(bot_id=bot_id, chat_id=chat_id, user_id=user_id,
+                          thread_id=thread_id, destiny=parts[-1])
+
+    @property
+    def cached_sessions(self) -> int:
+        return len(self._cache)
+
+    # --- запись в базу ---
+
+    async def _flush_loop(self):
+        while self._dirty and not self._closed:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Записывает все накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            # Сериализуем здесь, в event loop: set_data копирует словарь лишь
+            # поверхностно, а хендлеры меняют вложенные списки на месте
+            # (meal_list.append), так что json.dumps в потоке пула мог бы
+            # поймать список посреди изменения
+            upserts, deletes = _serialize(dirty)
+            try:
+                await run_db(db.save_fsm_states, upserts, deletes)
+            except Exception:
+                logger.exception("Не удалось сохранить состояния FSM, повторим позже")
+                # Более свежие изменения тех же ключей не затираем
+                for k, record in dirty.items():
+                    self._dirty.setdefault(k, record)
+                return
+            # Пустые сессии в памяти не держим
+            for k in deletes:
+                record = self._cache.get(k)
+                if record is not None and record.empty and k not in self._dirty:
+                    del self._cache[k]
+
+    # --- API BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k, record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(k, record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        _, record = await self._record(key)
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        k, record = await self._record(key)
+        record.data = data.copy()
+        self._mark_dirty(k, record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, record = await self._record(key)
+        return record.data.copy()
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.flush()
+
+def _deep_sizeof(obj, seen=None) -> int:
+    """Грубая оценка памяти объекта вместе с вложенными dict/list"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+EvictCallback = Callable[[StorageKey, str | None, dict[str, Any]], Awaitable[None]]
+
+class EvictingStorage(BaseStorage):
+    """Обертка над хранилищем с TTL простоя и лимитом числа сессий.
+
+    Брошенная сессия (без обращений дольше idle_ttl) сбрасывается; перед этим
+    вызывается on_evict, например чтобы сохранить недособранный прием пищи.
+    Сверх max_sessions самые давние сессии убираются из памяти: у SQLiteStorage
+    состояние остается в базе, у MemoryStorage — сбрасывается. Сессии
+    SQLiteStorage, которых нет в памяти, считаются брошенными по updated_at
+    в базе и проходят через тот же on_evict, по sweep_batch за проход.
+
+    shard — (номер, число) воркера в кластере: база общая, и каждый воркер
+    разбирает в ней только сессии своих пользователей (user_id % число).
+    """
+
+    def __init__(self, inner: BaseStorage, idle_ttl: float = FSM_IDLE_TTL,
+                 max_sessions: int = FSM_MAX_SESSIONS, sweep_interval: float = FSM_SWEEP_INTERVAL,
+                 on_evict: EvictCallback | None = None, sweep_batch: int = FSM_SWEEP_BATCH,
+                 shard: tuple[int, int] | None = None):
+        self.inner = inner
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self.shard = shard
+        self.on_evict = on_evict
+        # Ключ -> время последнего обращения; порядок — от самых давних
+        self._last_seen: OrderedDict[StorageKey, float] = OrderedDict()
+        self._sweep_task: asyncio.Task | None = None
+        self.evicted = 0
+
+    def _touch(self, key: StorageKey):
+        self._last_seen[key] = time.monotonic()
+        self._last_seen.move_to_end(key)
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop())
+
+    @property
+    def session_count(self) -> int:
+        return len(self._last_seen)
+
+    def memory_estimate(self) -> int:
+        """Примерный объем памяти сессий в байтах"""
+        if isinstance(self.inner, SQLiteStorage):
+            records = self.inner._cache.values()
+        elif isinstance(self.inner, MemoryStorage):
+            records = self.inner.storage.values()
+        else:
+            records = ()
+        size = sys.getsizeof(self._last_seen) + 100 * len(self._last_seen)
+        for record in records:
+            size += _deep_sizeof(record.data) + sys.getsizeof(record.state)
+        return size
+
+    # --- вытеснение ---
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Ошибка при очистке сессий FSM")
+
+    async def sweep(self):
+        """Один проход: брошенные сессии в памяти, превышение лимита, брошенные в базе"""
+        deadline = time.monotonic() - self.idle_ttl
+        abandoned = []
+        for key, seen in self._last_seen.items():
+            if seen > deadline:
+                break
+            abandoned.append(key)
+        overflow = max(0, len(self._last_seen) - len(abandoned) - self.max_sessions)
+        extra = list(self._last_seen)[len(abandoned):len(abandoned) + overflow] if overflow else []
+
+        for i, key in enumerate(abandoned):
+            await self._evict(key, abandoned=True)
+            if i % 100 == 99:
+                await asyncio.sleep(0)  # не держим event loop на больших проходах
+        for i, key in enumerate(extra):
+            await self._evict(key, abandoned=False)
+            if i % 100 == 99:
+                await asyncio.sleep(0)
+        stored = await self.sweep_stored()
+        if abandoned or extra or stored:
+            logger.info("Сессии FSM: брошенных %s, сверх лимита %s, из базы %s, осталось %s",
+                        len(abandoned), len(extra), stored, len(self._last_seen))
+
+    async def sweep_stored(self) -> int:
+        """Брошенные сессии, которых нет в памяти: вытесненные сверх лимита
+        или оставшиеся в базе с прошлого запуска. Возвращает, сколько убрано."""
+        inner = self.inner
+        if not isinstance(inner, SQLiteStorage):
+            return 0
+        keys, after = [], ('', '')
+        for _ in range(SWEEP_PAGES):
+            page = await get_stale_fsm_keys(self.idle_ttl, self.sweep_batch, after)
+            # Сессии в памяти разбирает sweep по времени последнего обращения
+            keys += [row['key'] for row in page if self._owns(row['key']) and not inner.in_memory(row['key'])]
+            if len(page) < self.sweep_batch or len(keys) >= self.sweep_batch:
+                break
+            after = (page[-1]['updated_at'], page[-1]['key'])
+        keys = keys[:self.sweep_batch]
+        if not keys:
+            return 0
+        rows = await take_stale_fsm_states(keys, self.idle_ttl)
+        for i, row in enumerate(rows):
+            k = row['key']
+            record = inner._cache.get(k) or inner._dirty.get(k)
+            if record is not None:
+                # Пользователь вернулся, пока шел запрос: копию из памяти запишем снова
+                inner._mark_dirty(k, record)
+                continue
+            data = json.loads(row['data'])
+            if (row['state'] is not None or data) and self.on_evict is not None:
+                key = inner.parse_key(k)
+                if key is None:
+                    logger.warning("Не удалось разобрать ключ FSM %s", k)
+                else:
+                    try:
+                        await self.on_evict(key, row['state'], data)
+                    except Exception:
+                        logger.exception("Не удалось обработать брошенную сессию %s", key)
+            self.evicted += 1
+            if i % 100 == 99:
+                await asyncio.sleep(0)
+        return len(rows)
+
+    def _owns(self, k: str) -> bool:
+        """Сессия из базы принадлежит этому процессу (в кластере — его шарду)"""
+        if self.shard is None:
+            return True
+        # Чужой или неразборный ключ не трогаем: его сессия может быть жива в другом воркере
+        key = self.inner.parse_key(k)
+        index, count = self.shard
+        return key is not None and key.user_id % count == index
+
+    async def _evict(self, key: StorageKey, abandoned: bool):
+        seen = self._last_seen.get(key)
+        if seen is None:
+            return
+        persistent = isinstance(self.inner, SQLiteStorage)
+        if abandoned or not persistent:
+            state = await self.inner.get_state(key)
+            data = await self.inner.get_data(key)
+            # Пока ждали хранилище, пользователь мог вернуться
+            if self._last_seen.get(key) != seen:
+                return
+            if (state is not None or data) and self.on_evict is not None:
+                try:
+                    await self.on_evict(key, state, data)
+                except Exception:
+                    logger.exception("Не удалось обработать брошенную сессию %s", key)
+            await self.inner.set_state(key, None)
+            await self.inner.set_data(key, {})
+        self._last_seen.pop(key, None)
+        if persistent:
+            self.inner.evict(key)
+        elif isinstance(self.inner, MemoryStorage):
+            self.inner.storage.pop(key, None)
+        self.evicted += 1
+
+    # --- API BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._touch(key)
+        await self.inner.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        self._touch(key)
+        return await self.inner.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        self._touch(key)
+        await self.inner.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        self._touch(key)
+        return await self.inner.get_data(key)
+
+    async def close(self) -> None:
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            self._sweep_task = None
+        await self.inner.close()
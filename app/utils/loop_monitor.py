@@ -0,0 +1,38 @@
+"""Наблюдение за event loop: насколько опаздывают таймеры и сколько памяти у процесса.
+
+Корутина каждые PROBE секунд засыпает и меряет, на сколько позже проснулась;
+раз в interval секунд пишет в лог p50/max задержки и RSS. Если задержка
+растет — какой-то код держит event loop (синхронная работа вне пула).
+"""
+import asyncio
+import logging
+import os
+import resource
+
+logger = logging.getLogger(__name__)
+
+PROBE = 0.1
+
+def rss_mb() -> float:
+    """Текущая память процесса (на Linux — из /proc, иначе пиковая)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def monitor_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    lags = []
+    next_report = loop.time() + interval
+    while True:
+        started = loop.time()
+        await asyncio.sleep(PROBE)
+        now = loop.time()
+        lags.append(max(0.0, now - started - PROBE) * 1000)
+        if now >= next_report:
+            lags.sort()
+            logger.info("Лаг event loop: p50 %.1f мс, p99 %.1f мс, max %.1f мс; RSS %.1f МБ",
+                        lags[len(lags) // 2], lags[min(len(lags) - 1, len(lags) * 99 // 100)], lags[-1], rss_mb())
+            lags.clear()
+            next_report = now + interval
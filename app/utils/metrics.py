@@ -0,0 +1,179 @@
+"""Метрики процесса в формате Prometheus без внешних зависимостей.
+
+Что собирается:
+- bot_update_seconds{type} — апдейт целиком (внешняя middleware диспетчера);
+- bot_handler_seconds{handler} и bot_handler_errors_total — каждый хендлер
+  (внутренняя middleware, имя берется из register_handlers);
+- db_call_seconds{func} — выполнение функции database.py в потоке пула,
+  db_wait_seconds — ожидание свободного потока (см. run_db);
+- bot_api_seconds{method} и bot_api_errors_total — запросы к Bot API
+  (middleware сессии бота);
+- счетчики кэшей профилей и итогов дня.
+
+Отдаются на http://METRICS_HOST:METRICS_PORT/metrics (METRICS_PORT=0 — выключено).
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды: от 1 мс до 10 с
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+class Registry:
+    """Гистограммы и счетчики с одной меткой; пишут и event loop, и потоки пула"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._histograms = defaultdict(dict)  # имя -> {(метка, значение): Histogram}
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._collectors = []
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def observe(self, name: str, label: tuple[str, str], seconds: float):
+        with self._lock:
+            histogram = self._histograms[name].get(label)
+            if histogram is None:
+                histogram = self._histograms[name][label] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name: str, label: tuple[str, str], value: int = 1):
+        with self._lock:
+            self._counters[name][label] += value
+
+    def collector(self, func):
+        """func() -> [(имя, тип, {метка: значение} или None, значение)] — снимается при каждом запросе"""
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                header(name, "histogram")
+                for (key, value), h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float("inf"),), h.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f'{name}_bucket{{{key}="{value}",le="{le}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{key}="{value}"}} {h.sum:.6f}')
+                    lines.append(f'{name}_count{{{key}="{value}"}} {h.count}')
+            for name, series in sorted(self._counters.items()):
+                header(name, "counter")
+                for (key, value), count in sorted(series.items()):
+                    lines.append(f'{name}{{{key}="{value}"}} {count}')
+
+        for func in self._collectors:
+            try:
+                samples = func()
+            except Exception:
+                logger.exception("Ошибка сборщика метрик %s", func.__name__)
+                continue
+            declared = set()
+            for name, kind, labels, value in samples:
+                if name not in declared:
+                    header(name, kind)
+                    declared.add(name)
+                label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+                lines.append(f"{name}{label_text} {value}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+registry.describe("bot_update_seconds", "Время обработки апдейта целиком")
+registry.describe("bot_handler_seconds", "Время выполнения хендлера")
+registry.describe("bot_handler_errors_total", "Исключения в хендлерах")
+registry.describe("db_call_seconds", "Выполнение функции базы данных в потоке пула")
+registry.describe("db_wait_seconds", "Ожидание свободного потока пула базы данных")
+registry.describe("bot_api_seconds", "Запросы к Bot API")
+registry.describe("bot_api_errors_total", "Ошибки запросов к Bot API")
+
+# --- middleware ---
+
+class UpdateTimer(BaseMiddleware):
+    """Внешняя middleware на dp.update: апдейт целиком, включая фильтры и FSM"""
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            registry.observe("bot_update_seconds", ("type", event.event_type), time.perf_counter() - started)
+
+class HandlerTimer(BaseMiddleware):
+    """Внутренняя middleware: вызывается только для сработавшего хендлера"""
+
+    async def __call__(self, handler, event, data):
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            registry.inc("bot_handler_errors_total", ("handler", name))
+            raise
+        finally:
+            registry.observe("bot_handler_seconds", ("handler", name), time.perf_counter() - started)
+
+class ApiTimer(BaseRequestMiddleware):
+    """Middleware сессии бота: задержка каждого метода Bot API"""
+
+    async def __call__(self, make_request, bot: Bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            registry.inc("bot_api_errors_total", ("method", name))
+            raise
+        finally:
+            registry.observe("bot_api_seconds", ("method", name), time.perf_counter() - started)
+
+def install(dp):
+    dp.update.outer_middleware(UpdateTimer())
+    timer = HandlerTimer()
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(timer)
+
+# --- HTTP ---
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    async def handle(request):
+        return web.Response(text=registry.render(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Метрики: http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,370 @@
+"""Версионированные миграции схемы — единственный источник схемы базы.
+
+Каждая миграция выполняется один раз в своей транзакции, номер применённой
+версии записывается в schema_version. init_db и служебные скрипты
+(rebuild.py, fresh_db.py, seed.py) вызывают run_migrations, поэтому старые
+базы обновляются на месте, а новые получают ту же схему.
+"""
+import datetime
+
+from .food_index import normalize_name
+
+MIGRATIONS = []
+
+def migration(version: int, description: str):
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+def _current_version(conn) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def run_migrations(conn) -> int:
+    """Применяет недостающие миграции и возвращает текущую версию схемы"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    conn.commit()
+
+    current = _current_version(conn)
+    for version, description, func in MIGRATIONS:
+        if version <= current:
+            continue
+        # IMMEDIATE: второй процесс, стартующий одновременно, подождет нас
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if _current_version(conn) >= version:
+                conn.rollback()
+                continue
+            func(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+            print(f"Миграция {version} применена: {description}")
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+    return current
+
+def _column_types(conn, table):
+    return {row[1]: (row[2] or '').upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+
+# --- МИГРАЦИИ ---
+
+@migration(1, "базовая схема: users, logs, foods")
+def _base_schema(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        age INTEGER,
+        weight REAL,
+        height REAL,
+        gender TEXT,
+        activity TEXT,
+        daily_norm REAL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        kcal REAL, protein REAL, fat REAL, carbs REAL,
+        details TEXT, meal_name TEXT,
+        date TEXT DEFAULT (date('now', 'localtime')),
+        timestamp DATETIME DEFAULT (datetime('now', 'localtime'))
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS foods (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        kcal REAL, protein REAL, fat REAL, carbs REAL
+    )
+    """)
+
+@migration(2, "users.activity всегда TEXT")
+def _users_activity_text(conn):
+    # Базы из rebuild.py/fresh_db.py создавались с activity REAL
+    if _column_types(conn, "users").get("activity") == "TEXT":
+        return
+    conn.execute("""
+    CREATE TABLE users_new (
+        user_id INTEGER PRIMARY KEY,
+        age INTEGER,
+        weight REAL,
+        height REAL,
+        gender TEXT,
+        activity TEXT,
+        daily_norm REAL
+    )
+    """)
+    conn.execute("""
+        INSERT INTO users_new (user_id, age, weight, height, gender, activity, daily_norm)
+        SELECT user_id, age, weight, height, gender, CAST(activity AS TEXT), daily_norm FROM users
+    """)
+    conn.execute("DROP TABLE users")
+    conn.execute("ALTER TABLE users_new RENAME TO users")
+
+@migration(3, "нормализованные уникальные названия продуктов")
+def _foods_unique_name(conn):
+    # Приводим названия к нормальной форме; из дублей оставляем самый старый id
+    seen = {}
+    duplicates = []
+    renames = []
+    for food_id, name in conn.execute("SELECT id, name FROM foods ORDER BY id"):
+        norm = normalize_name(name or '')
+        if norm in seen:
+            duplicates.append((food_id,))
+        else:
+            seen[norm] = food_id
+            if norm != name:
+                renames.append((norm, food_id))
+    conn.executemany("DELETE FROM foods WHERE id = ?", duplicates)
+    conn.executemany("UPDATE foods SET name = ? WHERE id = ?", renames)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_foods_name ON foods(name)")
+
+@migration(4, "индекс логов по пользователю и дате")
+def _logs_user_date_index(conn):
+    # get_daily_stats/get_daily_logs: фильтр по (user_id, date), сортировка по timestamp
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_logs_user_date ON logs(user_id, date, timestamp)")
+
+@migration(5, "дневные итоги daily_totals")
+def _daily_totals(conn):
+    # Сумма по дню хранится готовой: отчеты за неделю/месяц читают один диапазон PK
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_totals (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        kcal REAL NOT NULL DEFAULT 0,
+        protein REAL NOT NULL DEFAULT 0,
+        fat REAL NOT NULL DEFAULT 0,
+        carbs REAL NOT NULL DEFAULT 0,
+        meals INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, date)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO daily_totals (user_id, date, kcal, protein, fat, carbs, meals)
+        SELECT user_id, date, TOTAL(kcal), TOTAL(protein), TOTAL(fat), TOTAL(carbs), COUNT(*)
+        FROM logs
+        WHERE user_id IS NOT NULL AND date IS NOT NULL
+        GROUP BY user_id, date
+    """)
+
+@migration(6, "users.is_active для рассылок")
+def _users_is_active(conn):
+    # Заблокировавшие бота пользователи помечаются 0 и пропускаются в напоминаниях
+    if "is_active" not in _column_types(conn, "users"):
+        conn.execute("ALTER TABLE users ADD COLUMN is_active INTEGER NOT NULL DEFAULT 1")
+
+@migration(7, "users.last_log_at и индекс для напоминаний")
+def _users_last_log_at(conn):
+    # '' вместо NULL: так пользователь без записей сортируется первым и попадает в индекс
+    if "last_log_at" not in _column_types(conn, "users"):
+        conn.execute("ALTER TABLE users ADD COLUMN last_log_at TEXT NOT NULL DEFAULT ''")
+    conn.execute("""
+        UPDATE users SET last_log_at = COALESCE(
+            (SELECT MAX(timestamp) FROM logs WHERE logs.user_id = users.user_id), ''
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_users_reminder ON users(is_active, last_log_at, user_id)")
+
+@migration(8, "часовые пояса и время напоминаний пользователей")
+def _reminder_times(conn):
+    if "timezone" not in _column_types(conn, "users"):
+        conn.execute("ALTER TABLE users ADD COLUMN timezone TEXT NOT NULL DEFAULT 'Europe/Moscow'")
+    # minute — минута от местной полуночи; (timezone, minute) — "корзина" планировщика
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS reminder_times (
+        user_id INTEGER NOT NULL,
+        timezone TEXT NOT NULL,
+        minute INTEGER NOT NULL,
+        PRIMARY KEY (user_id, minute)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_reminder_bucket ON reminder_times(timezone, minute, user_id)")
+    # Все, кто уже зарегистрирован, сохраняют прежние напоминания: 11:30 и 19:46 по Москве
+    for minute in (11 * 60 + 30, 19 * 60 + 46):
+        conn.execute("""
+            INSERT OR IGNORE INTO reminder_times (user_id, timezone, minute)
+            SELECT user_id, timezone, ? FROM users
+        """, (minute,))
+
+@migration(9, "хранилище состояний FSM")
+def _fsm_states(conn):
+    # key — строка DefaultKeyBuilder (бот, чат, пользователь, destiny); data — JSON
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS fsm_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data TEXT NOT NULL DEFAULT '{}',
+        updated_at DATETIME DEFAULT (datetime('now', 'localtime'))
+    ) WITHOUT ROWID
+    """)
+
+@migration(10, "аренды (leases) для задач, которые должен выполнять один процесс")
+def _leases(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """)
+
+@migration(11, "служебная таблица meta (ревизия каталога и т.п.)")
+def _meta(conn):
+    # catalog_rev увеличивается при каждом массовом изменении foods (импорт),
+    # по нему процессы бота узнают, что индекс продуктов пора перестроить
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    ) WITHOUT ROWID
+    """)
+
+@migration(12, "foods.source: builtin, custom или import")
+def _foods_source(conn):
+    # Встроенный каталог обновляется только в своих строках; что из
+    # существующего было встроенным, определяем по названиям текущего каталога
+    from .catalog import catalog_rows
+
+    if "source" not in _column_types(conn, "foods"):
+        conn.execute("ALTER TABLE foods ADD COLUMN source TEXT NOT NULL DEFAULT 'custom'")
+    conn.executemany(
+        "UPDATE foods SET source = 'builtin' WHERE name = ?",
+        [(row[0],) for row in catalog_rows()]
+    )
+
+@migration(13, "позиции приемов пищи meal_items")
+def _meal_items(conn):
+    # Одна строка на продукт в приеме. user_id и date повторяют logs, чтобы
+    # "что я ел чаще всего за месяц" читалось одним диапазоном индекса без join.
+    # name — название на момент записи: продукт могут переименовать или удалить
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS meal_items (
+        id INTEGER PRIMARY KEY,
+        log_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        food_id INTEGER,
+        name TEXT NOT NULL,
+        grams REAL NOT NULL,
+        kcal REAL NOT NULL DEFAULT 0,
+        protein REAL NOT NULL DEFAULT 0,
+        fat REAL NOT NULL DEFAULT 0,
+        carbs REAL NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_meal_items_user_date ON meal_items(user_id, date, food_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_meal_items_food ON meal_items(food_id, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_meal_items_log ON meal_items(log_id)")
+    _backfill_meal_items(conn)
+
+def _backfill_meal_items(conn, chunk=10_000):
+    """Позиции старых записей восстанавливаются из строки logs.details"""
+    from .parser import parse_meal_details
+
+    foods = {}
+
+    def find_food(name):
+        if name not in foods:
+            foods[name] = conn.execute(
+                "SELECT id, kcal, protein, fat, carbs FROM foods WHERE name = ?", (name,)
+            ).fetchone()
+        return foods[name]
+
+    last_id = 0
+    while True:
+        logs = conn.execute("""
+            SELECT id, user_id, date, kcal, protein, fat, carbs, details FROM logs
+            WHERE id > ? AND user_id IS NOT NULL AND details IS NOT NULL
+            ORDER BY id LIMIT ?
+        """, (last_id, chunk)).fetchall()
+        if not logs:
+            break
+        rows = []
+        for log_id, user_id, date, kcal, protein, fat, carbs, details in logs:
+            items = parse_meal_details(details)
+            if not items:
+                continue
+            totals = (kcal or 0, protein or 0, fat or 0, carbs or 0)
+            if len(items) == 1:
+                # Единственная позиция — это весь прием, значения берем из лога как есть
+                name, grams = items[0]
+                food = find_food(normalize_name(name))
+                rows.append((log_id, user_id, date, food[0] if food else None, name, grams, *totals))
+                continue
+            # Несколько позиций: найденные в каталоге считаем по нему, остаток
+            # суммы приема делим между ненайденными пропорционально весу
+            known, unknown = [], []
+            for name, grams in items:
+                food = find_food(normalize_name(name))
+                if food:
+                    factor = grams / 100.0
+                    # В старых строках foods значения могут быть NULL
+                    known.append((name, grams, food[0], tuple((v or 0) * factor for v in food[1:])))
+                else:
+                    unknown.append((name, grams))
+            rest = [max(total - sum(k[3][i] for k in known), 0) for i, total in enumerate(totals)]
+            unknown_grams = sum(grams for _, grams in unknown) or 1
+            for name, grams, food_id, values in known:
+                rows.append((log_id, user_id, date, food_id, name, grams, *values))
+            for name, grams in unknown:
+                share = grams / unknown_grams
+                rows.append((log_id, user_id, date, None, name, grams, *(v * share for v in rest)))
+        conn.executemany("""
+            INSERT INTO meal_items (log_id, user_id, date, food_id, name, grams, kcal, protein, fat, carbs)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        last_id = logs[-1][0]
+
+@migration(14, "счетчики частых продуктов user_foods")
+def _user_foods(conn):
+    # score — сумма весов записей (см. frequent_foods), grams — та же сумма,
+    # умноженная на граммы: grams / score — привычная порция
+    from .frequent_foods import usage_weight
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_foods (
+        user_id INTEGER NOT NULL,
+        food_id INTEGER NOT NULL,
+        score REAL NOT NULL DEFAULT 0,
+        grams REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, food_id)
+    ) WITHOUT ROWID
+    """)
+    # Начальные значения — из уже записанных позиций, с весом по дню записи
+    rows = {}
+    for user_id, food_id, date, times, grams in conn.execute("""
+        SELECT user_id, food_id, date, COUNT(*), TOTAL(grams) FROM meal_items
+        WHERE food_id IS NOT NULL
+        GROUP BY user_id, food_id, date
+    """):
+        weight = usage_weight(datetime.datetime.fromisoformat(date).timestamp())
+        score, total = rows.get((user_id, food_id), (0.0, 0.0))
+        rows[(user_id, food_id)] = (score + times * weight, total + grams * weight)
+    conn.executemany(
+        "INSERT OR REPLACE INTO user_foods (user_id, food_id, score, grams) VALUES (?, ?, ?, ?)",
+        [(user_id, food_id, score, grams) for (user_id, food_id), (score, grams) in rows.items()]
+    )
+
+@migration(15, "индекс fsm_states по updated_at для очистки брошенных сессий")
+def _fsm_states_updated(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_fsm_states_updated ON fsm_states(updated_at)")
+
+@migration(16, "удаление ix_users_reminder: напоминания читаются через reminder_times")
+def _drop_users_reminder_index(conn):
+    # Корзину напоминаний ведет ix_reminder_bucket, users читается по первичному
+    # ключу; старый индекс только дорожал на каждой записи last_log_at в log_meal
+    conn.execute("DROP INDEX IF EXISTS ix_users_reminder")
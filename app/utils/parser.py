@@ -1,12 +1,14 @@
 import re
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 def parse_food_input(text: str) -> tuple[str | None, int | None]:
     text = text.strip().lower()
     if not text:
         return None, None
 
-    # Регулярка ищет число в конце строки с возможными единицами измерения
-    match = re.search(r'(\d+(?:\.\d+)?)\s*([гkгр]|грамм|гр|кг)?\s*$', text, re.IGNORECASE)
+    # Регулярка ищет число в конце строки с возможными единицами измерения;
+    # дробная часть — через точку или запятую ("2,5 кг")
+    match = re.search(r'(\d+(?:[.,]\d+)?)\s*([гkгр]|грамм|гр|кг)?\s*$', text, re.IGNORECASE)
     
     if not match:
         # Если числа нет, возвращаем весь текст как название
@@ -34,4 +36,50 @@ def parse_food_input(text: str) -> tuple[str | None, int | None]:
             
         return name_part, weight
     except (ValueError, TypeError):
-        return name_part, None
\ No newline at end of file
+        return name_part, None
+
+# Разделители позиций: перевод строки, ";" и запятая, если за ней не цифра (не "2,5")
+_ITEM_SEPARATOR = re.compile(r'\s*(?:\n|;|,(?!\d))\s*')
+
+def parse_meal_input(text: str) -> list[tuple[str, int | None]]:
+    """'курица 200, рис 150\nогурец' -> [('курица', 200), ('рис', 150), ('огурец', None)]"""
+    items = []
+    for part in _ITEM_SEPARATOR.split(text):
+        name, weight = parse_food_input(part)
+        if name:
+            items.append((name, weight))
+    return items
+
+# Позиция в logs.details, как ее пишет summarize_meal: "название (200г)".
+# В названии могут быть и скобки, и запятые: "курица филе (отварное) (200г)"
+_DETAILS_ITEM = re.compile(r'\s*(.+?) \((\d+)г\)(?:,|$)')
+
+def parse_meal_details(details: str) -> list[tuple[str, int]]:
+    """'курица (200г), рис (150г)' -> [('курица', 200), ('рис', 150)]"""
+    return [(m.group(1), int(m.group(2))) for m in _DETAILS_ITEM.finditer(details or '')]
+
+def parse_reminder_times(text):
+    """'9:00, 14:30' -> [540, 870]; неверные значения пропускаются"""
+    minutes = set()
+    for hours, mins in re.findall(r'(\d{1,2})[:.](\d{2})', text):
+        hours, mins = int(hours), int(mins)
+        if hours < 24 and mins < 60:
+            minutes.add(hours * 60 + mins)
+    return sorted(minutes)
+
+def parse_timezone(text: str) -> str | None:
+    """'Europe/Berlin' или смещение '+3', 'UTC+3', 'GMT-5' -> имя зоны IANA"""
+    text = text.strip()
+    match = re.fullmatch(r'(?:utc|gmt)?\s*([+-])\s*(\d{1,2})', text, re.IGNORECASE)
+    if match:
+        hours = int(match.group(2))
+        if hours > 14:
+            return None
+        # В зонах Etc/GMT знак инвертирован: UTC+3 == Etc/GMT-3
+        sign = '-' if match.group(1) == '+' else '+'
+        return 'UTC' if hours == 0 else f'Etc/GMT{sign}{hours}'
+    try:
+        ZoneInfo(text)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+    return text
@@ -1,32 +1,82 @@
+import datetime
+import logging
+import os
+import socket
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from aiogram import Bot
-from ..utils.database import get_db_connection
-
-async def send_reminders(bot: Bot):
-    # Получаем список всех пользователей из базы
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT user_id FROM users")
-    users = cur.fetchall()
-    conn.close()
-
-    for user in users:
-        try:
-            user_id = user['user_id']
-            # Здесь можно добавить проверку: если пользователь сегодня уже ел, не писать ему
-            await bot.send_message(
-                user_id, 
-                "🔔 <b>Напоминание</b>\nНе забудьте записать ваш последний прием пищи, чтобы статистика была точной! 🍎",
-                parse_mode="HTML"
-            )
-        except Exception as e:
-            print(f"Не удалось отправить напоминание {user['user_id']}: {e}")
+from config import (
+    REMINDER_RATE, REMINDER_CONCURRENCY, REMINDER_CHUNK_SIZE, REMINDER_SKIP_HOURS,
+    DEFAULT_TIMEZONE, REMINDER_SYNC_MINUTES,
+)
+from ..utils.async_database import get_reminder_user_ids, get_reminder_buckets, try_acquire_lease
+from .fanout import fan_out
+
+logger = logging.getLogger(__name__)
+
+REMINDER_TEXT = "🔔 <b>Напоминание</b>\nНе забудьте записать ваш последний прием пищи, чтобы статистика была точной! 🍎"
+
+# Напоминания сгруппированы в "корзины" (часовой пояс, минута дня):
+# одна задача APScheduler на корзину, а не на пользователя
+JOB_PREFIX = "reminder"
+# Владелец аренды — этот процесс; аренда не дает двум процессам разослать одну корзину
+LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+# Дольше misfire_grace_time, чтобы опоздавший процесс не разослал корзину повторно
+LEASE_TTL = 600
+
+def bucket_job_id(timezone, minute):
+    return f"{JOB_PREFIX}:{timezone}:{minute}"
+
+async def iter_reminder_chunks(timezone, minute, cutoff):
+    # Читаем пачками только тех, кто не ел после cutoff
+    after = 0
+    while True:
+        user_ids = await get_reminder_user_ids(timezone, minute, cutoff, after, REMINDER_CHUNK_SIZE)
+        if not user_ids:
+            return
+        yield user_ids
+        after = user_ids[-1]
+
+async def send_reminders(bot: Bot, timezone: str, minute: int):
+    if not await try_acquire_lease(bucket_job_id(timezone, minute), LEASE_OWNER, LEASE_TTL):
+        logger.info("Корзину %s:%s уже рассылает другой процесс", timezone, minute)
+        return None
+    # Время в логах локальное (datetime('now', 'localtime')), сравниваем в том же формате
+    cutoff = (datetime.datetime.now() - datetime.timedelta(hours=REMINDER_SKIP_HOURS)).strftime("%Y-%m-%d %H:%M:%S")
+    return await fan_out(
+        bot, iter_reminder_chunks(timezone, minute, cutoff), REMINDER_TEXT,
+        rate=REMINDER_RATE, concurrency=REMINDER_CONCURRENCY,
+        parse_mode="HTML"
+    )
+
+def ensure_bucket_job(scheduler: AsyncIOScheduler, bot: Bot, timezone: str, minute: int):
+    """Заводит задачу корзины, если ее еще нет (вызывается и при смене настроек)"""
+    job_id = bucket_job_id(timezone, minute)
+    if scheduler.get_job(job_id) is None:
+        scheduler.add_job(
+            send_reminders, 'cron', hour=minute // 60, minute=minute % 60, timezone=timezone,
+            args=[bot, timezone, minute], id=job_id, replace_existing=True,
+            misfire_grace_time=300, coalesce=True
+        )
+
+async def sync_reminder_jobs(scheduler: AsyncIOScheduler, bot: Bot):
+    """Сверяет задачи планировщика с корзинами в базе: добавляет новые, убирает пустые"""
+    buckets = set(await get_reminder_buckets())
+    wanted = {bucket_job_id(tz, minute) for tz, minute in buckets}
+    for tz, minute in buckets:
+        ensure_bucket_job(scheduler, bot, tz, minute)
+    for job in scheduler.get_jobs():
+        if job.id.startswith(JOB_PREFIX + ":") and job.id not in wanted:
+            job.remove()
+    logger.info("Корзин напоминаний: %s", len(buckets))
 
 def setup_scheduler(bot: Bot):
-    scheduler = AsyncIOScheduler(timezone="Europe/Moscow") # Укажи свой часовой пояс
-    
-    # Напоминания в 14:00 (обед) и 20:00 (ужин)
-    scheduler.add_job(send_reminders, 'cron', hour=11, minute=30, args=[bot])
-    scheduler.add_job(send_reminders, 'cron', hour=19, minute=46, args=[bot])
-    
-    return scheduler
\ No newline at end of file
+    scheduler = AsyncIOScheduler(timezone=DEFAULT_TIMEZONE)
+
+    # Задачи корзин создаются из базы сразу после старта и потом периодически
+    scheduler.add_job(
+        sync_reminder_jobs, 'interval', minutes=REMINDER_SYNC_MINUTES,
+        args=[scheduler, bot], id="reminder_sync",
+        next_run_time=datetime.datetime.now(datetime.timezone.utc)
+    )
+
+    return scheduler
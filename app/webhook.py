@@ -0,0 +1,144 @@
+"""Режим webhook: aiohttp-сервер принимает апдейты и раздает их пулу воркеров.
+
+Апдейты одного пользователя всегда попадают в одну очередь (шард по user_id),
+поэтому порядок сообщений и работа с FSM сохраняются, а разные пользователи
+обрабатываются параллельно. Очереди ограничены: если воркеры не успевают,
+сервер ждет WEBHOOK_QUEUE_TIMEOUT и отвечает 503 — Telegram пришлет апдейт повторно.
+"""
+import asyncio
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+from config import (
+    WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET,
+    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_QUEUE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def update_user_id(update: dict) -> int:
+    """user_id автора апдейта (для шардирования); если его нет — update_id"""
+    for value in update.values():
+        if isinstance(value, dict):
+            sender = value.get("from") or value.get("user")
+            if isinstance(sender, dict) and "id" in sender:
+                return sender["id"]
+    return update.get("update_id", 0)
+
+class UpdateWorkerPool:
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = WEBHOOK_WORKERS,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE):
+        self.dp = dp
+        self.bot = bot
+        per_worker = max(1, queue_size // workers)
+        self._queues = [asyncio.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._tasks = []
+        self.processed = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+
+    async def stop(self):
+        """Дорабатывает то, что уже в очередях, и останавливает воркеров"""
+        for q in self._queues:
+            await q.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, update: dict, timeout: float = WEBHOOK_QUEUE_TIMEOUT) -> bool:
+        q = self._queues[update_user_id(update) % len(self._queues)]
+        try:
+            await asyncio.wait_for(q.put(update), timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        return True
+
+    async def _worker(self, q: asyncio.Queue):
+        while True:
+            update = await q.get()
+            try:
+                await self.dp.feed_raw_update(self.bot, update)
+                self.processed += 1
+            except Exception:
+                logger.exception("Ошибка при обработке апдейта %s", update.get("update_id"))
+            finally:
+                q.task_done()
+
+def create_app(submit) -> web.Application:
+    """aiohttp-приложение, передающее каждый апдейт в submit(update) -> bool"""
+    async def handle_update(request: web.Request):
+        if WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not await submit(update):
+            # Очереди переполнены: Telegram повторит доставку позже
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    return app
+
+async def serve(submit):
+    """Запускает HTTP-сервер и возвращает runner для остановки"""
+    runner = web.AppRunner(create_app(submit), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logging.info("Webhook-сервер слушает %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+    return runner
+
+async def wait_for_stop_signal():
+    """Ждет SIGTERM/SIGINT (остановка контейнера, Ctrl+C), чтобы остановиться штатно:
+    без этого процесс убивает обработчик по умолчанию и finally не выполняется"""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    signals = (signal.SIGTERM, signal.SIGINT)
+    for sig in signals:
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        for sig in signals:
+            loop.remove_signal_handler(sig)
+    logger.info("Получен сигнал остановки")
+
+async def register_webhook(bot: Bot, allowed_updates):
+    if WEBHOOK_BASE_URL:
+        await bot.set_webhook(
+            WEBHOOK_BASE_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=allowed_updates,
+            drop_pending_updates=True,
+            max_connections=100,
+        )
+    else:
+        logging.warning("WEBHOOK_BASE_URL не задан: webhook в Telegram не регистрируем (локальный режим)")
+
+async def run_webhook(bot: Bot, dp: Dispatcher, allowed_updates):
+    pool = UpdateWorkerPool(dp, bot)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    pool.start()
+    runner = await serve(pool.submit)
+    try:
+        await register_webhook(bot, allowed_updates)
+        await wait_for_stop_signal()
+    finally:
+        await runner.cleanup()
+        await pool.stop()
+        logging.info("Webhook: обработано %s апдейтов, отклонено %s", pool.processed, pool.rejected)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
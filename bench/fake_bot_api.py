@@ -0,0 +1,151 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Запуск отдельно (бот подключается через TELEGRAM_API_URL=http://127.0.0.1:8081):
+    python bench/fake_bot_api.py [порт] [лимит sendMessage в секунду]
+
+Поддерживает то, что использует бот: getUpdates (long polling),
+sendMessage, editMessageText, answerCallbackQuery, а на прочие методы
+(getMe, setMyCommands, deleteWebhook, ...) отвечает успехом. Апдейты
+подкладывает тест (FakeBotAPI.push), ответы бота доставляются в очереди
+чатов (FakeBotAPI.replies). С лимитом sendMessage сервер, как и Telegram,
+отвечает 429 с retry_after, когда бот пишет быстрее.
+"""
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+class FakeBotAPI:
+    def __init__(self, send_rate: float = 0.0):
+        self.send_rate = send_rate
+        self._updates = deque()
+        self._next_update_id = 1
+        self._new_updates = asyncio.Condition()
+        self._message_ids = defaultdict(int)
+        self._send_tokens = send_rate
+        self._send_updated = time.monotonic()
+        # chat_id -> очередь ответов бота: (время, текст, inline-клавиатура или None)
+        self.replies = defaultdict(asyncio.Queue)
+        self.calls = defaultdict(int)
+        self.acked = 0
+        self.throttled = 0
+        self.polling = asyncio.Event()
+
+    # --- сторона теста ---
+
+    async def push(self, update: dict) -> int:
+        async with self._new_updates:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            self._updates.append({"update_id": update_id, **update})
+            self._new_updates.notify_all()
+        return update_id
+
+    @property
+    def pending(self) -> int:
+        return len(self._updates)
+
+    # --- сторона бота ---
+
+    def _message(self, chat_id, text, message_id=None):
+        if message_id is None:
+            self._message_ids[chat_id] += 1
+            message_id = self._message_ids[chat_id]
+        return {
+            "message_id": message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER, "text": text,
+        }
+
+    def _throttle(self) -> bool:
+        if not self.send_rate:
+            return False
+        now = time.monotonic()
+        self._send_tokens = min(self.send_rate, self._send_tokens + (now - self._send_updated) * self.send_rate)
+        self._send_updated = now
+        if self._send_tokens < 1:
+            self.throttled += 1
+            return True
+        self._send_tokens -= 1
+        return False
+
+    async def get_updates(self, params):
+        self.polling.set()
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        limit = int(params.get("limit") or 100)
+        async with self._new_updates:
+            # Все, что младше offset, бот подтвердил
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+                self.acked += 1
+            if not self._updates and timeout:
+                try:
+                    await asyncio.wait_for(self._new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return [update for _, update in zip(range(limit), self._updates)]
+
+    def send_message(self, params):
+        chat_id = int(params["chat_id"])
+        markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+        keyboard = markup.get("inline_keyboard") if markup else None
+        self.replies[chat_id].put_nowait((time.monotonic(), params.get("text", ""), keyboard))
+        return self._message(chat_id, params.get("text", ""))
+
+    def edit_message_text(self, params):
+        chat_id = int(params["chat_id"])
+        return self._message(chat_id, params.get("text", ""), int(params["message_id"]))
+
+    async def handle(self, request: web.Request):
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        name = method.lower()
+        if name == "getupdates":
+            result = await self.get_updates(params)
+        elif name == "sendmessage":
+            if self._throttle():
+                return web.json_response({
+                    "ok": False, "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }, status=429)
+            result = self.send_message(params)
+        elif name == "editmessagetext":
+            result = self.edit_message_text(params)
+        elif name == "getme":
+            result = BOT_USER
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+async def start_server(api: FakeBotAPI, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+    runner = web.AppRunner(api.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+async def main(port: int, send_rate: float):
+    api = FakeBotAPI(send_rate)
+    await start_server(api, port=port)
+    print(f"Заглушка Bot API: http://127.0.0.1:{port} (TELEGRAM_API_URL)")
+    while True:
+        await asyncio.sleep(10)
+        print(f"вызовов: {dict(api.calls)}, подтверждено апдейтов: {api.acked}, 429: {api.throttled}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(int(args[0]) if args else 8081, float(args[1]) if len(args) > 1 else 0.0))
@@ -0,0 +1,81 @@
+"""Бенчмарк SQLiteStorage: накладные расходы FSM на один апдейт.
+
+Запуск из корня проекта (использует временную базу):
+    python bench/fsm_storage.py [пользователей] [апдейтов на пользователя]
+
+Каждый "апдейт" повторяет то, что делает хендлер сбора приема пищи:
+get_state + get_data + set_data + set_state.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_fsm.db")
+
+from aiogram.fsm.storage.base import StorageKey
+
+from app.utils.database import init_db
+from app.utils.async_database import close_pool
+from app.utils.fsm_storage import SQLiteStorage
+
+BOT_ID = 42
+
+async def one_update(storage, key, step):
+    await storage.get_state(key)
+    data = await storage.get_data(key)
+    meal = data.get('meal_list', [])
+    meal.append({'kcal': 165.0, 'prot': 31.0, 'fat': 3.6, 'carb': 0.0, 'name': 'курица', 'weight': 100 + step})
+    data['meal_list'] = meal
+    await storage.set_data(key, data)
+    await storage.set_state(key, "BotStates:collecting_meal")
+
+async def main(users: int, updates: int):
+    init_db()
+    storage = SQLiteStorage()
+    keys = [StorageKey(bot_id=BOT_ID, chat_id=uid, user_id=uid) for uid in range(1, users + 1)]
+
+    # Первый апдейт пользователя — промах кэша (чтение из базы)
+    cold = []
+    for key in keys:
+        started = time.perf_counter()
+        await one_update(storage, key, 0)
+        cold.append((time.perf_counter() - started) * 1000)
+
+    hot = []
+    for step in range(1, updates):
+        for key in keys:
+            started = time.perf_counter()
+            await one_update(storage, key, step)
+            hot.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await storage.close()
+    close_sec = time.perf_counter() - started
+
+    # Восстановление после "рестарта": новое хранилище читает состояния из базы
+    restored = SQLiteStorage()
+    started = time.perf_counter()
+    ok = 0
+    for key in keys:
+        if len((await restored.get_data(key)).get('meal_list', [])) == updates:
+            ok += 1
+    restore_sec = time.perf_counter() - started
+    await restored.close()
+    close_pool()
+
+    hot.sort()
+    print(f"пользователей: {users}, апдейтов: {users * updates}")
+    print(f"холодный апдейт (чтение из базы): avg {statistics.mean(cold):.3f} мс")
+    print(f"горячий апдейт: avg {statistics.mean(hot):.4f} мс, "
+          f"p99 {hot[int(len(hot) * 0.99) - 1]:.4f} мс, max {hot[-1]:.3f} мс")
+    print(f"финальная запись при закрытии: {close_sec * 1000:.1f} мс")
+    print(f"восстановлено после рестарта: {ok}/{users} за {restore_sec * 1000:.1f} мс")
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main(users, updates))
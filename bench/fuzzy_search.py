@@ -0,0 +1,83 @@
+"""Бенчмарк нечеткого поиска: задержка не должна расти вместе с каталогом.
+
+Запуск из корня проекта:
+    python bench/fuzzy_search.py [размеры каталогов...]
+
+Строит синтетические каталоги (реальные слова + случайные "бренды",
+чтобы словарь тоже рос) и меряет на запросах с опечатками сначала
+FoodIndex.fuzzy_search, а затем search_foods целиком — через базу
+(временную), как его вызывает бот: точный поиск, проверка новых строк
+в SQL и только потом нечеткий поиск.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_fuzzy.db")
+
+from app.utils import database as db
+from app.utils.food_index import FoodIndex
+
+BASE_WORDS = [
+    'курица', 'филе', 'индейка', 'говядина', 'свинина', 'гречка', 'рис', 'овсянка',
+    'творог', 'кефир', 'молоко', 'сыр', 'йогурт', 'яблоко', 'банан', 'хлеб',
+    'макароны', 'картофель', 'лосось', 'тунец', 'шоколад', 'печенье', 'сок', 'колбаса',
+]
+MODIFIERS = ['сырое', 'отварное', 'жареное', 'запеченное', 'тушеное', 'копченое', 'домашнее']
+SYLLABLES = ['ма', 'ко', 'ри', 'ту', 'ла', 'не', 'во', 'ст', 'ар', 'би', 'зо', 'ки']
+QUERIES = ['курца', 'гречька', 'творк', 'бонан', 'малоко', 'говядена тушеная', 'лососъ', 'шоколат']
+
+def make_catalog(size: int, rng: random.Random):
+    for food_id in range(1, size + 1):
+        brand = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        name = f"{rng.choice(BASE_WORDS)} {rng.choice(MODIFIERS)} {brand}"
+        yield {'id': food_id, 'name': name, 'kcal': 100, 'protein': 10, 'fat': 5, 'carbs': 10}
+
+def measure(search, rounds: int = 200):
+    timings = []
+    for i in range(rounds):
+        query = QUERIES[i % len(QUERIES)]
+        started = time.perf_counter()
+        search(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.mean(timings), timings[int(len(timings) * 0.95) - 1]
+
+def bench(size: int, threshold: float = 0.3):
+    rng = random.Random(size)
+    index = FoodIndex()
+    started = time.perf_counter()
+    index.build(make_catalog(size, rng))
+    build_sec = time.perf_counter() - started
+
+    avg, p95 = measure(lambda query: index.fuzzy_search(query, threshold))
+    print(f"{size:>9} продуктов | словарь {len(index._words):>7} слов | "
+          f"индекс {build_sec:6.2f} с | fuzzy avg {avg:6.3f} мс, p95 {p95:6.3f} мс")
+
+def bench_search_foods(size: int):
+    """Тот же каталог в таблице foods; индекс процесса строится из нее"""
+    conn = db.get_db_connection()
+    conn.execute("DELETE FROM foods")
+    conn.executemany(
+        "INSERT INTO foods (id, name, kcal, protein, fat, carbs, source) VALUES (?, ?, ?, ?, ?, ?, 'import')",
+        [(f['id'], f"{f['name']} #{f['id']}", f['kcal'], f['protein'], f['fat'], f['carbs'])
+         for f in make_catalog(size, random.Random(size))]
+    )
+    db.bump_catalog_rev(conn)
+    conn.commit()
+    db.load_food_index()
+
+    avg, p95 = measure(db.search_foods)
+    print(f"{size:>9} продуктов | search_foods (база + индекс) avg {avg:6.3f} мс, p95 {p95:6.3f} мс")
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1_000, 10_000, 100_000, 300_000]
+    for size in sizes:
+        bench(size)
+    db.init_db()
+    for size in sizes:
+        bench_search_foods(size)
@@ -0,0 +1,185 @@
+"""Нагрузочный бенчмарк хендлеров: настоящий Dispatcher, Telegram подменен заглушкой.
+
+Запуск из корня проекта (использует временную базу):
+    python bench/handlers.py [пользователей] [приемов пищи на пользователя] [задержка API, мс]
+
+Каждый симулируемый пользователь проходит регистрацию (/start → анкета),
+затем несколько раз: поиск продукта с выбором варианта кнопкой, несколько
+продуктов одним сообщением, "✅ Это всё" → название приема, статистика
+за день и /week. Пользователи работают параллельно, апдейты одного
+пользователя — по очереди (как при шардировании по user_id).
+
+Ответы Bot API отдает StubSession (без сети), поэтому в цифрах — только
+наш код: хендлеры, FSM, поиск и база. Итог — апдейтов в секунду и
+p50/p95/p99 по каждому хендлеру.
+"""
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_handlers.db")
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage, EditMessageText
+from aiogram.types import Message
+
+from app.dispatcher import create_dispatcher
+from app.utils.database import init_db, warm_food_index
+from app.utils.async_database import close_pool
+
+BOT_ID = 42
+TOKEN = f"{BOT_ID}:bench"
+
+class StubSession(BaseSession):
+    """Сессия без сети: sendMessage/editMessageText возвращают сообщение, остальное — True"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = defaultdict(int)
+        self.last_markup = {}  # chat_id -> последняя inline-клавиатура бота
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            if method.reply_markup is not None and hasattr(method.reply_markup, "inline_keyboard"):
+                self.last_markup[method.chat_id] = method.reply_markup
+            return Message.model_validate({
+                "message_id": method.message_id if isinstance(method, EditMessageText) else next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": method.chat_id, "type": "private"},
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "bench"},
+                "text": method.text,
+            }, context={"bot": bot})
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+class HandlerTimer:
+    """Внутренняя middleware: время выполнения каждого хендлера"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            name = data["handler"].callback.__name__
+            self.samples[name].append((time.perf_counter() - started) * 1000)
+
+class SimUser:
+    def __init__(self, dp, bot, session, user_id, update_ids, latencies):
+        self.dp, self.bot, self.session = dp, bot, session
+        self.user_id = user_id
+        self.update_ids = update_ids
+        self.latencies = latencies
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+        self.chat = {"id": user_id, "type": "private"}
+
+    async def _feed(self, update):
+        update["update_id"] = next(self.update_ids)
+        started = time.perf_counter()
+        await self.dp.feed_raw_update(self.bot, update)
+        self.latencies.append((time.perf_counter() - started) * 1000)
+
+    async def send(self, text):
+        await self._feed({"message": {
+            "message_id": next(self.update_ids), "date": int(time.time()),
+            "chat": self.chat, "from": self.user, "text": text,
+        }})
+
+    async def press_first_button(self):
+        markup = self.session.last_markup.pop(self.user_id, None)
+        if markup is None:
+            return
+        await self._feed({"callback_query": {
+            "id": str(next(self.update_ids)), "from": self.user, "chat_instance": "bench",
+            "data": markup.inline_keyboard[0][0].callback_data,
+            "message": {
+                "message_id": next(self.update_ids), "date": int(time.time()), "chat": self.chat,
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "bench"}, "text": "🔍 Выберите вариант:",
+            },
+        }})
+
+    async def register(self):
+        for text in ("/start", "Мужчина 👦", "30", "180", "80", "Средний (3-5 тренировок в неделю)"):
+            await self.send(text)
+
+    async def log_meal(self):
+        await self.send("🍎 Начать запись приема пищи")
+        await self.send("гречка 150")
+        await self.press_first_button()
+        await self.send("🟢 Добавить еще")
+        await self.send("курица филе (отварное) 200, огурец свежий 100\nкефир 250")
+        await self.press_first_button()
+        await self.send("✅ Это всё")
+        await self.send("Обед 🍲")
+        await self.send("📊 Статистика за день")
+        await self.send("/week")
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+def report(name, samples):
+    print(f"{name:<28} {len(samples):>7} {statistics.median(samples):>8.2f} "
+          f"{percentile(samples, 95):>8.2f} {percentile(samples, 99):>8.2f} {max(samples):>8.2f}")
+
+async def main(users: int, meals: int, api_latency_ms: float):
+    init_db()
+    warm_food_index()
+    session = StubSession(api_latency_ms / 1000)
+    bot = Bot(TOKEN, session=session)
+    dp = create_dispatcher()
+    timer = HandlerTimer()
+    dp.message.middleware(timer)
+    dp.callback_query.middleware(timer)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    update_ids = itertools.count(1)
+    latencies = []
+    sims = [SimUser(dp, bot, session, 1000 + i, update_ids, latencies) for i in range(users)]
+
+    async def scenario(sim):
+        await sim.register()
+        for _ in range(meals):
+            await sim.log_meal()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(scenario(sim) for sim in sims))
+    elapsed = time.perf_counter() - started
+
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    close_pool()
+
+    print(f"Пользователей: {users}, приемов пищи на пользователя: {meals}, задержка API: {api_latency_ms:.0f} мс")
+    print(f"Апдейтов: {len(latencies)} за {elapsed:.2f} с — {len(latencies) / elapsed:.0f} апдейтов/с")
+    print(f"Вызовов Bot API: {dict(session.calls)}\n")
+    print(f"{'хендлер (мс)':<28} {'вызовов':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, samples in sorted(timer.samples.items(), key=lambda x: -statistics.median(x[1])):
+        report(name, samples)
+    report("апдейт целиком", latencies)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if len(args) > 0 else 200,
+        int(args[1]) if len(args) > 1 else 3,
+        float(args[2]) if len(args) > 2 else 0.0,
+    ))
@@ -0,0 +1,207 @@
+"""Длительный сквозной тест: настоящий main.py против заглушки Bot API.
+
+Запуск из корня проекта:
+    python bench/soak.py [пользователей] [длительность, с] [интервал отчета, с] [лимит sendMessage/с]
+
+Поднимает bench/fake_bot_api.py, запускает main.py отдельным процессом
+(TELEGRAM_API_URL указывает на заглушку, база — временная; остальные
+переменные окружения, например WORKER_PROCESSES, передаются как есть)
+и имитирует пользователей: регистрация, затем по кругу запись приемов
+пищи, статистика и /week с паузами "на подумать". Каждый пользователь ждет
+ответа бота перед следующим сообщением.
+
+Раз в интервал печатает: подтвержденные ботом апдейты в секунду, задержку
+ответа p50/p99, память процесса бота, лаг его event loop (из лога
+монитора) и размер файла базы. В конце — рост памяти и базы за прогон.
+"""
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from bench.fake_bot_api import FakeBotAPI, start_server
+
+PORT = 8081
+TOKEN = "42:soak"
+REPLY_TIMEOUT = 30
+LAG_RE = re.compile(r"Лаг event loop: p50 ([\d.]+) мс, p99 ([\d.]+) мс, max ([\d.]+) мс; RSS ([\d.]+) МБ")
+
+REGISTRATION = ["/start", "Мужчина 👦", "30", "180", "80", "Средний (3-5 тренировок в неделю)"]
+FOODS = ["гречка 150", "курица 200", "кефир 250", "банан 120", "творог 180", "рис 200", "яблоко 150"]
+
+def process_rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def db_size_mb(path: str) -> float:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)) / 2 ** 20
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.timeouts = 0
+        self.lag = None  # последняя строка монитора event loop
+        self.errors = 0
+
+class SoakUser:
+    def __init__(self, api: FakeBotAPI, user_id: int, stats: Stats, think: float, rng: random.Random):
+        self.api = api
+        self.user_id = user_id
+        self.stats = stats
+        self.think = think
+        self.rng = rng
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+        self.chat = {"id": user_id, "type": "private"}
+        self.keyboard = None
+        self._message_id = 0
+
+    async def _exchange(self, update):
+        replies = self.api.replies[self.user_id]
+        while not replies.empty():
+            replies.get_nowait()
+        started = time.monotonic()
+        await self.api.push(update)
+        try:
+            answered, _, keyboard = await asyncio.wait_for(replies.get(), REPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            return
+        self.stats.latencies.append((answered - started) * 1000)
+        if keyboard:
+            self.keyboard = keyboard
+
+    async def send(self, text):
+        self._message_id += 1
+        await self._exchange({"message": {
+            "message_id": self._message_id, "date": int(time.time()),
+            "chat": self.chat, "from": self.user, "text": text,
+        }})
+
+    async def press_first_button(self):
+        keyboard, self.keyboard = self.keyboard, None
+        if not keyboard:
+            return
+        self._message_id += 1
+        await self._exchange({"callback_query": {
+            "id": f"{self.user_id}:{self._message_id}", "from": self.user, "chat_instance": "soak",
+            "data": keyboard[0][0]["callback_data"],
+            "message": {"message_id": self._message_id, "date": int(time.time()), "chat": self.chat,
+                        "from": {"id": 42, "is_bot": True, "first_name": "FakeBot"}, "text": "🔍"},
+        }})
+
+    async def pause(self):
+        await asyncio.sleep(self.rng.expovariate(1 / self.think))
+
+    async def run(self, deadline):
+        for text in REGISTRATION:
+            await self.send(text)
+            await self.pause()
+        while time.monotonic() < deadline:
+            await self.send("🍎 Начать запись приема пищи")
+            for food in self.rng.sample(FOODS, self.rng.randint(1, 3)):
+                await self.pause()
+                self.keyboard = None
+                await self.send(food)
+                await self.press_first_button()
+            await self.send("✅ Это всё")
+            await self.send("Обед 🍲")
+            await self.pause()
+            await self.send(self.rng.choice(["📊 Статистика за день", "/week"]))
+            await self.pause()
+
+async def read_bot_log(stream, stats: Stats, verbose: bool):
+    async for raw in stream:
+        line = raw.decode(errors="replace").rstrip()
+        match = LAG_RE.search(line)
+        if match:
+            stats.lag = tuple(float(x) for x in match.groups())
+        elif "| ERROR |" in line or "Traceback" in line:
+            stats.errors += 1
+            if verbose:
+                print("  [бот]", line)
+
+async def main(users: int, duration: float, report_every: float, send_rate: float):
+    api = FakeBotAPI(send_rate)
+    runner = await start_server(api, port=PORT)
+    db_path = os.path.join(tempfile.mkdtemp(), "soak.db")
+    env = {
+        **os.environ,
+        "BOT_TOKEN": TOKEN,
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{PORT}",
+        "DB_PATH": db_path,
+        "BOT_MODE": "polling",
+        "LOOP_MONITOR_INTERVAL": str(report_every),
+    }
+    bot = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "main.py"), cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+    )
+    stats = Stats()
+    log_task = asyncio.create_task(read_bot_log(bot.stdout, stats, verbose=True))
+    await asyncio.wait_for(api.polling.wait(), 60)
+    print(f"Бот запущен (pid {bot.pid}), пользователей: {users}, длительность: {duration:.0f} с")
+
+    rng = random.Random(1)
+    started = time.monotonic()
+    deadline = started + duration
+    think = 1.0
+    sims = [SoakUser(api, 100_000 + i, stats, think, random.Random(rng.random())) for i in range(users)]
+
+    async def start_user(sim, delay):
+        # Плавный разгон: пользователи приходят в течение первых 10% прогона (не дольше 60 с)
+        await asyncio.sleep(delay)
+        await sim.run(deadline)
+
+    ramp = min(60.0, duration / 10)
+    tasks = [asyncio.create_task(start_user(sim, ramp * i / users)) for i, sim in enumerate(sims)]
+
+    first_rss, first_db = process_rss_mb(bot.pid), db_size_mb(db_path)
+    acked = 0
+    print(f"{'время, с':>8} {'апд/с':>7} {'p50, мс':>8} {'p99, мс':>8} {'таймауты':>8} "
+          f"{'RSS, МБ':>8} {'лаг p99/max, мс':>16} {'база, МБ':>9} {'очередь':>7} {'429':>5}")
+    while time.monotonic() < deadline:
+        await asyncio.sleep(min(report_every, max(0.0, deadline - time.monotonic())))
+        window = api.acked - acked
+        acked = api.acked
+        latencies, stats.latencies = stats.latencies, []
+        p50 = statistics.median(latencies) if latencies else 0
+        p99 = sorted(latencies)[int(len(latencies) * 0.99)] if latencies else 0
+        lag = f"{stats.lag[1]:.1f}/{stats.lag[2]:.1f}" if stats.lag else "-"
+        print(f"{time.monotonic() - started:>8.0f} {window / report_every:>7.0f} {p50:>8.1f} {p99:>8.1f} "
+              f"{stats.timeouts:>8} {process_rss_mb(bot.pid):>8.1f} {lag:>16} {db_size_mb(db_path):>9.1f} "
+              f"{api.pending:>7} {api.throttled:>5}", flush=True)
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.monotonic() - started
+    last_rss, last_db = process_rss_mb(bot.pid), db_size_mb(db_path)
+    bot.terminate()
+    await bot.wait()
+    log_task.cancel()
+    await runner.cleanup()
+
+    print(f"\nИтого: {api.acked} апдейтов за {elapsed:.0f} с — {api.acked / elapsed:.0f} апдейтов/с, "
+          f"таймаутов ответа {stats.timeouts}, ошибок в логе бота {stats.errors}")
+    print(f"Память бота: {first_rss:.1f} → {last_rss:.1f} МБ, база: {first_db:.1f} → {last_db:.1f} МБ")
+    print(f"Вызовы Bot API: {dict(api.calls)}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(
+        int(args[0]) if len(args) > 0 else 2000,
+        float(args[1]) if len(args) > 1 else 3600,
+        float(args[2]) if len(args) > 2 else 30,
+        float(args[3]) if len(args) > 3 else 0.0,
+    ))
@@ -0,0 +1,79 @@
+"""Нагрузочный тест webhook-режима: шлет поддельные апдейты на локальный сервер.
+
+Запуск (бот запущен с BOT_MODE=webhook):
+    python bench/webhook_load.py [--url http://127.0.0.1:8080/webhook]
+        [--users 500] [--updates 20000] [--concurrency 200]
+
+Имитирует всплеск после напоминания: много пользователей одновременно
+присылают продукты. Меряет принятые апдейты/с, задержку ответа сервера и
+число 503 (сработал back-pressure). Чтобы ответы бота никуда не уходили,
+направьте его на локальный фейковый Bot API (TELEGRAM_API_URL).
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import aiohttp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEXTS = ["курица 200", "гречка 150", "яблоко", "📊 Статистика за день", "кефир 250", "/start"]
+
+def fake_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"user{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+async def run(url: str, users: int, updates: int, concurrency: int, secret: str):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latencies, statuses = [], {}
+    counter = iter(range(1, updates + 1))
+    rng = random.Random(1)
+
+    async def poster(session):
+        for update_id in counter:
+            update = fake_update(update_id, rng.randint(1, users), rng.choice(TEXTS))
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=update, headers=headers) as resp:
+                    status = resp.status
+            except aiohttp.ClientError:
+                status = "error"
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(poster(session) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"апдейтов: {updates} от {users} пользователей, параллельно {concurrency}")
+    print(f"время: {elapsed:.2f} с, {updates / elapsed:.0f} апдейтов/с")
+    print(f"ответы: {statuses}")
+    print(f"задержка: p50 {percentile(latencies, 0.5):.1f} мс, "
+          f"p95 {percentile(latencies, 0.95):.1f} мс, p99 {percentile(latencies, 0.99):.1f} мс")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.users, args.updates, args.concurrency, args.secret))
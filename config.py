@@ -19,4 +19,116 @@ DB_PATH_RAW = os.getenv("DB_PATH", "data/calories_v2.db")
 DB_PATH = BASE_DIR / DB_PATH_RAW
 
 # Создаем папку, если её нет
-DB_PATH.parent.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+# --- БАЗА ДАННЫХ ---
+# Сколько потоков (и соединений SQLite) обслуживают асинхронный слой
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+# PRAGMA для каждого соединения. WAL + NORMAL: читатели не ждут писателя,
+# а коммит не делает fsync журнала (fsync только на чекпоинтах)
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+# Сколько ждать занятую базу, прежде чем получить "database is locked"
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Кэш страниц на соединение (КиБ) и размер mmap (байты, 0 — выключен)
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Сколько подготовленных выражений держит каждое соединение
+DB_CACHED_STATEMENTS = int(os.getenv("DB_CACHED_STATEMENTS", "256"))
+# Трассировка SQL (app/utils/db_trace.py): время и число строк каждого выражения,
+# запросы дольше DB_SLOW_QUERY_MS — в лог, с DB_EXPLAIN_SLOW=1 — вместе с планом
+DB_TRACE = os.getenv("DB_TRACE", "0") == "1"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "50"))
+DB_EXPLAIN_SLOW = os.getenv("DB_EXPLAIN_SLOW", "0") == "1"
+
+# --- ПОИСК ПРОДУКТОВ ---
+# Минимальное триграммное сходство слова для нечеткого поиска (0..1)
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_THRESHOLD", "0.3"))
+# Как часто (секунды) проверять, не изменился ли каталог (импорт), и перестраивать индекс
+FOOD_INDEX_REFRESH = float(os.getenv("FOOD_INDEX_REFRESH", "30"))
+
+# --- НАПОМИНАНИЯ ---
+# Лимит Telegram ~30 сообщений/с на бота; держим небольшой запас
+REMINDER_RATE = float(os.getenv("REMINDER_RATE", "25"))
+# Сколько отправок одновременно "в полете"
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", "20"))
+# Сколько user_id читаем из базы за раз
+REMINDER_CHUNK_SIZE = int(os.getenv("REMINDER_CHUNK_SIZE", "1000"))
+# Не напоминать тем, кто записывал прием пищи за последние N часов
+REMINDER_SKIP_HOURS = float(os.getenv("REMINDER_SKIP_HOURS", "3"))
+# Часовой пояс и напоминания по умолчанию для новых пользователей
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Europe/Moscow")
+DEFAULT_REMINDER_TIMES = os.getenv("DEFAULT_REMINDER_TIMES", "11:30,19:46")
+# Как часто планировщик сверяет свои задачи с корзинами в базе (минуты)
+REMINDER_SYNC_MINUTES = int(os.getenv("REMINDER_SYNC_MINUTES", "5"))
+
+# --- СОСТОЯНИЯ FSM ---
+# Изменения состояний копятся в памяти и пишутся в базу пачкой раз в N секунд
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))
+# ...или раньше, если накопилось столько измененных ключей
+FSM_FLUSH_BATCH = int(os.getenv("FSM_FLUSH_BATCH", "500"))
+# Сессия без обращений дольше N секунд считается брошенной и вытесняется
+FSM_IDLE_TTL = float(os.getenv("FSM_IDLE_TTL", str(6 * 60 * 60)))
+# Сколько сессий держать в памяти одновременно (самые давние вытесняются первыми)
+FSM_MAX_SESSIONS = int(os.getenv("FSM_MAX_SESSIONS", "100000"))
+# Как часто проверять сессии (секунды)
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "60"))
+# Сколько брошенных сессий из базы (которых нет в памяти) разбирать за один проход
+FSM_SWEEP_BATCH = int(os.getenv("FSM_SWEEP_BATCH", "500"))
+# Сохранять недособранный прием пищи брошенной сессии как черновик в дневник
+FSM_SAVE_DRAFTS = os.getenv("FSM_SAVE_DRAFTS", "0") == "1"
+
+# --- РЕЖИМ РАБОТЫ ---
+# polling — getUpdates; webhook — aiohttp-сервер принимает апдейты от Telegram
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публичный адрес, на который Telegram будет слать апдейты (https://example.com)
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Telegram присылает его в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Сколько апдейтов обрабатывается одновременно и сколько может ждать в очередях
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "2000"))
+# Сколько ждать места в очереди, прежде чем ответить Telegram 503 (он повторит)
+WEBHOOK_QUEUE_TIMEOUT = float(os.getenv("WEBHOOK_QUEUE_TIMEOUT", "5"))
+
+# --- НЕСКОЛЬКО ПРОЦЕССОВ ---
+# 0/1 — все в одном процессе; N > 1 — главный процесс принимает апдейты
+# (polling или webhook) и раздает их N процессам-воркерам по user_id
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+# Размер очереди апдейтов каждого процесса-воркера
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+
+# --- КЭШ ПРОФИЛЕЙ И ИТОГОВ ДНЯ ---
+# Сколько пользователей держать в кэше процесса и сколько секунд доверять записи
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "600"))
+
+# --- ЧАСТЫЕ ПРОДУКТЫ ---
+# Сколько кнопок частых продуктов показывать при записи приема пищи (0 — не показывать)
+FREQUENT_FOODS_LIMIT = int(os.getenv("FREQUENT_FOODS_LIMIT", "8"))
+# Раз в N секунд счетчики из памяти сбрасываются в базу
+FREQUENT_FOODS_FLUSH = float(os.getenv("FREQUENT_FOODS_FLUSH", "60"))
+
+# --- INLINE-ПОИСК (@bot гречка) ---
+# Сколько секунд Telegram может кэшировать ответ на одинаковый запрос
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+# Пауза перед поиском: пока пользователь печатает, промежуточные запросы отбрасываются
+INLINE_DEBOUNCE = float(os.getenv("INLINE_DEBOUNCE", "0.3"))
+# Кэш результатов в процессе: число запросов и время жизни (секунды)
+INLINE_RESULT_CACHE_SIZE = int(os.getenv("INLINE_RESULT_CACHE_SIZE", "5000"))
+INLINE_RESULT_CACHE_TTL = float(os.getenv("INLINE_RESULT_CACHE_TTL", "600"))
+
+# --- ДИАГНОСТИКА ---
+# Адрес Bot API (локальный telegram-bot-api или тестовый сервер bench/fake_bot_api.py);
+# пусто — https://api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Раз в N секунд писать в лог задержку event loop и память процесса (0 — выключено)
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0"))
+# Порт HTTP-эндпоинта /metrics в формате Prometheus (0 — выключено).
+# В режиме нескольких процессов воркер i слушает METRICS_PORT + 1 + i
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
@@ -0,0 +1,210 @@
+"""Массовый импорт каталога продуктов из CSV или JSONL.
+
+    python import_foods.py foods.csv [foods2.jsonl ...] [--chunk 100000] [--keep-existing]
+
+Колонки (регистр не важен): название/name, ккал/kcal/calories,
+белки/protein, жиры/fat, углеводы/carbs — все значения на 100 г.
+Файл читается потоково, память не зависит от его размера:
+
+1. строки пачками пишутся во временную таблицу без индексов;
+2. индекс по названию строится один раз после загрузки, повторы названий
+   из файла по нему же схлопываются до последней строки;
+3. в foods данные вливаются пачками в порядке названий (вставки в уникальный
+   индекс идут подряд, а не вразброс), каждая пачка — своя транзакция,
+   так что бот продолжает работать с базой во время импорта;
+4. в конце — ANALYZE и новая ревизия каталога: запущенные процессы бота
+   перестроят индекс продуктов сами.
+
+Существующие названия обновляются (кроме добавленных пользователями;
+с --keep-existing — не трогаются никакие),
+при повторах в файле побеждает последняя строка.
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+import time
+from itertools import islice
+
+from config import DB_PATH
+from app.utils.database import bump_catalog_rev
+from app.utils.food_index import normalize_name
+from app.utils.migrations import run_migrations
+
+FIELDS = ('name', 'kcal', 'protein', 'fat', 'carbs')
+ALIASES = {
+    'name': ('name', 'название', 'продукт', 'product', 'product_name'),
+    'kcal': ('kcal', 'ккал', 'калории', 'calories', 'energy_kcal', 'energy-kcal_100g'),
+    'protein': ('protein', 'белки', 'белок', 'proteins', 'proteins_100g'),
+    'fat': ('fat', 'жиры', 'fats', 'fat_100g'),
+    'carbs': ('carbs', 'углеводы', 'carbohydrates', 'carbohydrates_100g'),
+}
+
+def _column_map(keys):
+    """Поле каталога -> имя колонки в файле"""
+    lower = {key.strip().lower(): key for key in keys if key}
+    mapping = {}
+    for field, aliases in ALIASES.items():
+        for alias in aliases:
+            if alias in lower:
+                mapping[field] = lower[alias]
+                break
+    missing = [field for field in FIELDS if field not in mapping]
+    if missing:
+        raise SystemExit(f"❌ В файле нет колонок: {', '.join(missing)} (есть: {', '.join(keys)})")
+    return mapping
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = (value or '').strip().replace(',', '.')
+    return float(value) if value else 0.0
+
+def read_records(path, delimiter=None):
+    """Поток словарей из CSV или JSONL (формат — по расширению файла)"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            if delimiter is None:
+                sample = f.read(64 * 1024)
+                f.seek(0)
+                try:
+                    delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+                except csv.Error:
+                    delimiter = ','
+                    print(f"⚠️ {path}: не удалось определить разделитель, читаем через «,» "
+                          f"(другой можно указать через --delimiter)", flush=True)
+            yield from csv.DictReader(f, delimiter=delimiter)
+
+def clean_rows(records, stats):
+    """Нормализует названия и числа; битые строки пропускает и считает"""
+    mapping = None
+    for record in records:
+        stats['read'] += 1
+        if mapping is None:
+            mapping = _column_map(list(record))
+        try:
+            name = normalize_name(str(record[mapping['name']] or ''))
+            if not name:
+                raise ValueError("пустое название")
+            yield (name, _number(record[mapping['kcal']]), _number(record[mapping['protein']]),
+                   _number(record[mapping['fat']]), _number(record[mapping['carbs']]))
+        except (KeyError, ValueError, TypeError):
+            stats['skipped'] += 1
+
+def _report(label, rows, started):
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else 0
+    print(f"  {label}: {rows:,} строк за {elapsed:.1f} с ({rate:,.0f} строк/с)", flush=True)
+
+def import_files(paths, chunk=100_000, keep_existing=False, delimiter=None):
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    run_migrations(conn)
+    # Большой кэш страниц и временные данные на диске: память не растет с файлом
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -262144")
+    conn.execute("PRAGMA temp_store = FILE")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("DROP TABLE IF EXISTS temp.import_foods")
+    conn.execute("CREATE TEMP TABLE import_foods (name TEXT, kcal REAL, protein REAL, fat REAL, carbs REAL)")
+
+    stats = {'read': 0, 'skipped': 0}
+    started = time.perf_counter()
+    before = conn.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+
+    # 1. Загрузка во временную таблицу
+    print("📥 Чтение файлов...")
+    staged = 0
+    for path in paths:
+        rows = clean_rows(read_records(path, delimiter), stats)
+        while True:
+            batch = list(islice(rows, chunk))
+            if not batch:
+                break
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO import_foods VALUES (?, ?, ?, ?, ?)", batch)
+            conn.execute("COMMIT")
+            staged += len(batch)
+            _report("прочитано", staged, started)
+
+    # 2. Индекс по временной таблице — один раз, после загрузки (rowid в нем уже есть)
+    conn.execute("CREATE INDEX temp.ix_import_name ON import_foods(name)")
+    # Повторы названий: оставляем последнюю строку, чтобы она побеждала и с
+    # --keep-existing (там конфликт с foods — DO NOTHING, и первая строка
+    # пачки иначе закрепилась бы)
+    conn.execute("BEGIN")
+    duplicates = conn.execute("""
+        DELETE FROM import_foods
+        WHERE rowid < (SELECT MAX(rowid) FROM import_foods AS later WHERE later.name = import_foods.name)
+    """).rowcount
+    conn.execute("COMMIT")
+    if duplicates:
+        print(f"  повторов в файлах: {duplicates:,} (взяты последние строки)", flush=True)
+
+    # 3. Слияние с foods пачками в порядке названий
+    print("🔀 Слияние с каталогом...")
+    merge_started = time.perf_counter()
+    # Продукты, добавленные пользователями, импорт не перезаписывает
+    on_conflict = "NOTHING" if keep_existing else """UPDATE SET
+            kcal = excluded.kcal, protein = excluded.protein,
+            fat = excluded.fat, carbs = excluded.carbs
+        WHERE foods.source <> 'custom'"""
+    merge_sql = f"""
+        INSERT INTO foods (name, kcal, protein, fat, carbs, source)
+        SELECT name, kcal, protein, fat, carbs, 'import' FROM import_foods
+        WHERE (name, rowid) > (?, ?) AND (name, rowid) <= (?, ?)
+        ORDER BY name, rowid
+        ON CONFLICT (name) DO {on_conflict}
+    """
+    merged = 0
+    last = ('', 0)
+    while True:
+        # Граница пачки: chunk-я строка после предыдущей границы (по индексу)
+        bound = conn.execute("""
+            SELECT name, rowid FROM import_foods WHERE (name, rowid) > (?, ?)
+            ORDER BY name, rowid LIMIT 1 OFFSET ?
+        """, (*last, chunk - 1)).fetchone()
+        # Последняя пачка — до конца таблицы
+        upper = tuple(bound) if bound else ('\U0010ffff', 0)
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.execute(merge_sql, (*last, *upper))
+        conn.execute("COMMIT")
+        merged += max(cur.rowcount, 0)
+        _report("влито", merged, merge_started)
+        if bound is None:
+            break
+        last = upper
+
+    # 4. Статистика планировщика и ревизия каталога для процессов бота
+    conn.execute("BEGIN IMMEDIATE")
+    bump_catalog_rev(conn)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE foods")
+    conn.execute("DROP TABLE temp.import_foods")
+    after = conn.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+    conn.close()
+
+    print(f"✅ Импорт завершен: прочитано {stats['read']:,}, пропущено {stats['skipped']:,}, "
+          f"новых продуктов {after - before:,}, всего в каталоге {after:,}")
+    _report("итого", stats['read'], started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт каталога продуктов из CSV/JSONL")
+    parser.add_argument("paths", nargs="+", help="файлы .csv, .jsonl или .ndjson")
+    parser.add_argument("--chunk", type=int, default=100_000, help="строк в одной транзакции")
+    parser.add_argument("--keep-existing", action="store_true", help="не обновлять уже существующие названия")
+    parser.add_argument("--delimiter", help="разделитель CSV (по умолчанию определяется сам)")
+    args = parser.parse_args()
+    try:
+        import_files(args.paths, args.chunk, args.keep_existing, args.delimiter)
+    except FileNotFoundError as e:
+        print(f"❌ Файл не найден: {e.filename}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
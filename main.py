@@ -2,22 +2,26 @@ import sys
 import os
 import asyncio
 import logging
+import time
 
 # Исправляем пути импорта
 sys.path.append(os.path.join(os.getcwd()))
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+from aiogram import Bot
 from aiogram.types import BotCommand
 
 # Импортируем твои модули
-from app.handlers import register_handlers
+from app.dispatcher import ALLOWED_UPDATES, create_bot, create_dispatcher, spawn_background
 from app.utils.scheduler import setup_scheduler
 # Импортируем функцию инициализации базы данных
 from app.utils.database import init_db
+from app.utils.async_database import close_pool
+from app.webhook import run_webhook
+from app.cluster import run_cluster
+from app.utils.loop_monitor import monitor_loop_lag
+from app.utils.metrics import start_metrics_server
+from config import BOT_MODE, WORKER_PROCESSES, LOOP_MONITOR_INTERVAL, METRICS_HOST, METRICS_PORT
 
 # Настройка логирования
 logging.basicConfig(
@@ -42,48 +46,69 @@ if not BOT_TOKEN:
 async def set_commands(bot: Bot):
     commands = [
         BotCommand(command="start", description="Запустить бота / Проверить норму"),
+        BotCommand(command="week", description="Статистика за неделю"),
+        BotCommand(command="month", description="Статистика за месяц"),
+        BotCommand(command="top", description="Частые продукты за месяц"),
+        BotCommand(command="remind", description="Время напоминаний"),
+        BotCommand(command="timezone", description="Часовой пояс"),
         BotCommand(command="reset", description="Сбросить все данные и анкету"),
     ]
     await bot.set_my_commands(commands)
 
 async def main():
+    started = time.perf_counter()
     # 1. Инициализируем базу данных (создаем таблицы, если их нет)
     # Это исправит ошибку "no such table: logs"
     try:
         init_db()
-        logging.info("База данных успешно инициализирована (таблицы проверены).")
+        logging.info("База данных успешно инициализирована за %.2f с.", time.perf_counter() - started)
     except Exception as e:
         logging.error(f"Ошибка при инициализации базы данных: {e}")
         # Не выходим, пробуем запуститься дальше
 
-    bot = Bot(
-        token=BOT_TOKEN, 
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    dp = Dispatcher(storage=MemoryStorage())
+    bot = create_bot(BOT_TOKEN)
+    # В режиме нескольких процессов диспетчер и хендлеры живут в воркерах
+    clustered = WORKER_PROCESSES > 1
+    dp = None if clustered else create_dispatcher()
+    # Без диспетчера монитор event loop главного процесса запускаем сами
+    if clustered and LOOP_MONITOR_INTERVAL > 0:
+        spawn_background(monitor_loop_lag(LOOP_MONITOR_INTERVAL))
 
-    # Регистрация хендлеров
-    register_handlers(dp)
+    # Эндпоинт /metrics (воркеры поднимают свои на следующих портах)
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
 
     # Установка команд в меню
     await set_commands(bot)
 
     # Запуск планировщика
     scheduler = setup_scheduler(bot)
+    # Хендлеры /remind и /timezone получают планировщик из workflow data
+    # (в воркерах его нет: новые корзины подхватит синхронизация здесь)
+    if dp is not None:
+        dp["scheduler"] = scheduler
     scheduler.start()
     logging.info("Планировщик напоминаний запущен!")
 
-    logging.info("Бот успешно запущен и готов к работе!")
+    # Индекс продуктов строится в фоне, поэтому время старта не зависит от размера каталога
+    logging.info("Бот успешно запущен и готов к работе! Старт занял %.2f с", time.perf_counter() - started)
 
     try:
-        # Сбрасываем старые сообщения, которые пришли, пока бот был выключен
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot, allowed_updates=["message", "callback_query"])
+        if clustered:
+            await run_cluster(bot, BOT_TOKEN, WORKER_PROCESSES, BOT_MODE, ALLOWED_UPDATES)
+        elif BOT_MODE == "webhook":
+            await run_webhook(bot, dp, ALLOWED_UPDATES)
+        else:
+            # Сбрасываем старые сообщения, которые пришли, пока бот был выключен
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot, allowed_updates=ALLOWED_UPDATES)
     except Exception as e:
         logging.exception("Ошибка во время работы бота", exc_info=e)
     finally:
         scheduler.shutdown()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
+        close_pool()
 
 if __name__ == "__main__":
     try:
@@ -1,6 +1,7 @@
 import sqlite3
 import os
 from config import DB_PATH  # Он возьмет путь из твоего конфига
+from app.utils.migrations import run_migrations
 
 def rebuild():
     # Если старый файл базы мешает, мы его удаляем
@@ -14,33 +15,8 @@ def rebuild():
 
     print("🛠 Создаем таблицы...")
     
-    # Таблица пользователей
-    cur.execute("""
-    CREATE TABLE users (
-        user_id INTEGER PRIMARY KEY,
-        age INTEGER, weight REAL, height REAL, 
-        gender TEXT, activity REAL, daily_norm REAL
-    )""")
-
-    # Таблица логов (здесь все те колонки, на которые ругался бот)
-    cur.execute("""
-    CREATE TABLE logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        kcal REAL, protein REAL, fat REAL, carbs REAL,
-        details TEXT,
-        meal_name TEXT,
-        timestamp DATETIME DEFAULT (datetime('now', 'localtime')),
-        date DATE DEFAULT (date('now', 'localtime'))
-    )""")
-
-    # Таблица продуктов
-    cur.execute("""
-    CREATE TABLE foods (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE,
-        kcal REAL, protein REAL, fat REAL, carbs REAL
-    )""")
+    # Схема — из миграций (единый источник для бота и скриптов)
+    run_migrations(conn)
     
     # Добавим яблоко, чтобы база не была совсем пустой
     cur.execute("INSERT INTO foods (name, kcal, protein, fat, carbs) VALUES (?, ?, ?, ?, ?)", 